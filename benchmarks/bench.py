@@ -0,0 +1,372 @@
+"""
+Throughput and latency benchmarks of the dispatcher.
+
+Every scenario runs in a fresh process and drives `Dispatcher.listen` with synthetic messages the way the broker does:
+a message is given to the dispatcher only when it can accept it. The report contains msgs/sec, p50/p99 latency from
+`listen` to the end of the handler and the peak RSS of the process, written as JSON:
+
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --scenario routing --messages 200000
+    python benchmarks/bench.py --routers 20 --handlers 10 --filters 3 --middlewares 4 --timeouts
+
+With `--memory` the messages also pass through `MemoryBroker`, and with `--nats` through `NatsBroker` against
+a nats-server spawned on a free local port, the `nats-server` binary must be in PATH or given with `--nats-server`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict, replace
+from multiprocessing import get_context
+from typing import Any, Callable, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from magic_filter import F
+
+from taskorbit import Dispatcher, Router, Middleware, Message
+from taskorbit.__meta__ import __version__
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """
+    The parameters of a benchmark run.
+
+    Args:
+        name (str): The name of the scenario in the report.
+        messages (int): The number of measured messages.
+        warmup (int): The number of messages processed before the measurement.
+        pool_size (int): `Dispatcher(max_pool_size=...)`.
+        routers (int): The number of routers included into the dispatcher.
+        handlers (int): The number of handlers in each router, each one has its own `type_event`.
+        filters (int): The number of extra filters of each handler, besides the `type_event` filter.
+        middlewares (int): The number of outer middlewares.
+        inner_middlewares (int): The number of inner middlewares.
+        timeouts (bool): Give the handlers execution and close timeouts that never expire.
+        single_task (bool): `Dispatcher(single_task=...)`.
+        work (float): How long each handler sleeps, in seconds, 0 only yields to the loop.
+        memory (bool): Pass the messages through `MemoryBroker`.
+        nats (bool): Pass the messages through `NatsBroker` and a local nats-server.
+    """
+    name: str
+    messages: int = 50_000
+    warmup: int = 1_000
+    pool_size: int = 100
+    routers: int = 1
+    handlers: int = 1
+    filters: int = 0
+    middlewares: int = 0
+    inner_middlewares: int = 0
+    timeouts: bool = False
+    single_task: bool = False
+    work: float = 0.0
+    memory: bool = False
+    nats: bool = False
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "baseline": Scenario("baseline"),
+    "routing": Scenario("routing", routers=10, handlers=10, filters=2),
+    "middleware": Scenario("middleware", middlewares=5, inner_middlewares=5),
+    "timers": Scenario("timers", timeouts=True),
+    "single_task": Scenario("single_task", timeouts=True, single_task=True),
+}
+
+
+class PassMiddleware(Middleware):
+    async def __call__(self, handler: Callable, metadata: Message, data: dict[str, Any]) -> Any:
+        return await handler(metadata=metadata, data=data)
+
+
+class Recorder:
+    """Collects the latency of every message from its start time to the end of its handler"""
+    def __init__(self) -> None:
+        self.started: dict[str, float] = {}
+        self.latencies: list[float] = []
+        self.done = asyncio.Event()
+        self.expected = 0
+
+    def finish(self, metadata: Message) -> None:
+        start = self.started.pop(metadata.uuid, None)
+        if start is None:
+            start = metadata.data["sent"]
+        self.latencies.append(time.perf_counter() - start)
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+def build_dispatcher(scenario: Scenario, recorder: Recorder) -> tuple[Dispatcher, list[str]]:
+    """Builds the router tree of the scenario, returns the dispatcher and the `type_event` of each handler"""
+    dp = Dispatcher(max_pool_size=scenario.pool_size, single_task=scenario.single_task)
+    timeouts = dict(execution_timeout=3600, close_timeout=3600) if scenario.timeouts else {}
+    type_events = []
+
+    for router_index in range(scenario.routers):
+        router = Router(f"router-{router_index}")
+        for handler_index in range(scenario.handlers):
+            type_event = f"EVENT_{router_index}_{handler_index}"
+            type_events.append(type_event)
+            extra_filters = [F.metadata.uuid != f"never-{index}" for index in range(scenario.filters)]
+
+            async def handler(metadata: Message) -> None:
+                if scenario.work:
+                    await asyncio.sleep(scenario.work)
+                else:
+                    await asyncio.sleep(0)
+                recorder.finish(metadata)
+
+            handler.__name__ = f"handler_{router_index}_{handler_index}"
+            router.include_handler(F.metadata.type_event == type_event, *extra_filters, **timeouts)(handler)
+        dp.include_router(router)
+
+    for _ in range(scenario.middlewares):
+        dp.middleware.include(PassMiddleware())
+    for _ in range(scenario.inner_middlewares):
+        dp.inner_middleware.include(PassMiddleware())
+
+    return dp, type_events
+
+
+async def drive_dispatcher(dp: Dispatcher, recorder: Recorder, type_events: list[str], count: int) -> None:
+    recorder.expected = len(recorder.latencies) + count
+    recorder.done.clear()
+    for index in range(count):
+        await dp.wait_free()
+        message = Message(uuid=uuid.uuid4().hex, type_event=type_events[index % len(type_events)])
+        recorder.started[message.uuid] = time.perf_counter()
+        await dp.listen(message)
+
+    await recorder.done.wait()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def drive_nats(dp: Dispatcher, recorder: Recorder, type_events: list[str], count: int, nats_url: str) -> None:
+    from taskorbit.brokers.nats import NatsBroker
+
+    stream = f"BENCH{uuid.uuid4().hex[:8]}"
+    broker = NatsBroker(dict(url=nats_url, stream=stream, subject=f"{stream}.tasks", durable=stream, pull_mode=True, batch_size=256))
+    await broker.startup()
+
+    recorder.expected = len(recorder.latencies) + count
+    recorder.done.clear()
+    consumer = asyncio.create_task(broker.include_dispatcher(dp))
+    failures = await broker.pub_many(
+        {
+            "uuid": uuid.uuid4().hex,
+            "type_event": type_events[index % len(type_events)],
+            "data": {"sent": time.perf_counter()},
+        }
+        for index in range(count)
+    )
+    if failures:
+        raise RuntimeError(f"{len(failures)} messages have not been published")
+
+    await recorder.done.wait()
+    consumer.cancel()
+
+
+async def drive_memory(dp: Dispatcher, recorder: Recorder, type_events: list[str], count: int) -> None:
+    from taskorbit.brokers import MemoryBroker
+
+    broker = MemoryBroker(maxsize=1024)
+    recorder.expected = len(recorder.latencies) + count
+    recorder.done.clear()
+    consumer = asyncio.create_task(broker.include_dispatcher(dp))
+    for index in range(count):
+        message = Message(uuid=uuid.uuid4().hex, type_event=type_events[index % len(type_events)])
+        recorder.started[message.uuid] = time.perf_counter()
+        await broker.pub(message)
+
+    await recorder.done.wait()
+    consumer.cancel()
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def _peak_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_scenario(scenario: Scenario, nats_url: Optional[str] = None) -> dict[str, Any]:
+    """Runs the scenario in the current process and returns its report"""
+    async def main() -> dict[str, Any]:
+        recorder = Recorder()
+        dp, type_events = build_dispatcher(scenario, recorder)
+
+        async def drive(count: int) -> None:
+            if scenario.nats:
+                await drive_nats(dp, recorder, type_events, count, nats_url)
+            elif scenario.memory:
+                await drive_memory(dp, recorder, type_events, count)
+            else:
+                await drive_dispatcher(dp, recorder, type_events, count)
+
+        if scenario.warmup:
+            await drive(scenario.warmup)
+        recorder.latencies.clear()
+
+        start = time.perf_counter()
+        await drive(scenario.messages)
+        elapsed = time.perf_counter() - start
+
+        return {
+            "scenario": scenario.name,
+            "params": asdict(scenario),
+            "seconds": round(elapsed, 4),
+            "msgs_per_sec": round(scenario.messages / elapsed, 1),
+            "p50_ms": round(_percentile(recorder.latencies, 0.5) * 1000, 4),
+            "p99_ms": round(_percentile(recorder.latencies, 0.99) * 1000, 4),
+            "peak_rss_kb": _peak_rss_kb(),
+        }
+
+    return asyncio.run(main())
+
+
+class NatsServer:
+    """Spawns a nats-server with JetStream on a free local port"""
+    def __init__(self, binary: str) -> None:
+        self.binary = binary
+        self.port = _free_port()
+        self.url = f"nats://127.0.0.1:{self.port}"
+        self._store = tempfile.TemporaryDirectory(prefix="taskorbit-bench-")
+        self._process: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "NatsServer":
+        self._process = subprocess.Popen(
+            [self.binary, "-js", "-a", "127.0.0.1", "-p", str(self.port), "-sd", self._store.name],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.1).close()
+                return self
+            except OSError:
+                time.sleep(0.05)
+
+        self.__exit__()
+        raise RuntimeError(f"nats-server has not started on port {self.port}")
+
+    def __exit__(self, *args) -> None:
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait(timeout=10)
+        self._store.cleanup()
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Taskorbit dispatcher benchmarks")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Built-in scenarios to run, all by default")
+    parser.add_argument("--messages", type=int, default=None, help="The number of measured messages of each scenario")
+    parser.add_argument("--warmup", type=int, default=None, help="The number of warmup messages of each scenario")
+    parser.add_argument("--pool-size", type=int, default=None)
+    parser.add_argument("--routers", type=int, default=None, help="Run a custom scenario with this number of routers")
+    parser.add_argument("--handlers", type=int, default=None, help="Run a custom scenario with this number of handlers per router")
+    parser.add_argument("--filters", type=int, default=None, help="Run a custom scenario with this number of extra filters per handler")
+    parser.add_argument("--middlewares", type=int, default=None, help="Run a custom scenario with this number of outer middlewares")
+    parser.add_argument("--inner-middlewares", type=int, default=None, help="Run a custom scenario with this number of inner middlewares")
+    parser.add_argument("--timeouts", action="store_true", default=None, help="Run a custom scenario with handler timeouts")
+    parser.add_argument("--single-task", action="store_true", default=None, help="Run the scenarios in the single-task mode")
+    parser.add_argument("--work", type=float, default=None, help="How long each handler sleeps, in seconds")
+    parser.add_argument("--memory", action="store_true", help="Also run every scenario through MemoryBroker")
+    parser.add_argument("--nats", action="store_true", help="Also run every scenario through NatsBroker and a local nats-server")
+    parser.add_argument("--nats-server", default="nats-server", help="The path of the nats-server binary")
+    parser.add_argument("--output", default=None, help="Write the JSON report to the file instead of stdout")
+    return parser
+
+
+def _scenarios(args: argparse.Namespace) -> list[Scenario]:
+    common = {
+        name: getattr(args, name)
+        for name in ("messages", "warmup", "pool_size", "single_task", "work")
+        if getattr(args, name) is not None
+    }
+    custom = {
+        name: getattr(args, name)
+        for name in ("routers", "handlers", "filters", "middlewares", "inner_middlewares", "timeouts")
+        if getattr(args, name) is not None
+    }
+
+    if custom:
+        scenarios = [Scenario("custom", **custom)]
+    else:
+        scenarios = [SCENARIOS[name] for name in (args.scenario or SCENARIOS)]
+
+    scenarios = [replace(scenario, **common) for scenario in scenarios]
+    brokers = []
+    if args.memory:
+        brokers += [replace(scenario, name=f"{scenario.name}+memory", memory=True) for scenario in scenarios]
+    if args.nats:
+        brokers += [replace(scenario, name=f"{scenario.name}+nats", nats=True) for scenario in scenarios]
+
+    return scenarios + brokers
+
+
+def main() -> None:
+    args = _parser().parse_args()
+    scenarios = _scenarios(args)
+
+    server: Optional[NatsServer] = None
+    if args.nats:
+        binary = shutil.which(args.nats_server)
+        if binary is None:
+            raise SystemExit(f"The nats-server binary has not been found: {args.nats_server}")
+        server = NatsServer(binary).__enter__()
+
+    results = []
+    try:
+        for scenario in scenarios:
+            # Every scenario gets a fresh process, so the peak RSS and the allocator state do not leak between them
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                result = executor.submit(run_scenario, scenario, server.url if scenario.nats else None).result()
+            print(f"{result['scenario']:>20}: {result['msgs_per_sec']:>10} msgs/sec, p50 {result['p50_ms']} ms, "
+                  f"p99 {result['p99_ms']} ms, peak RSS {result['peak_rss_kb']} KiB", file=sys.stderr)
+            results.append(result)
+    finally:
+        if server is not None:
+            server.__exit__()
+
+    report = {
+        "taskorbit": __version__,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
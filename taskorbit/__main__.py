@@ -0,0 +1,4 @@
+from taskorbit.cli import main
+
+
+main()
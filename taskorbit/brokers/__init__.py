@@ -0,0 +1,5 @@
+from .base import BaseBroker
+from .memory import MemoryBroker
+
+
+__all__ = ['BaseBroker', 'MemoryBroker']
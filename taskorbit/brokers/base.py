@@ -0,0 +1,377 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from functools import partial
+from time import perf_counter
+from typing import Any, Callable, Iterable, AsyncIterable, AsyncIterator, Coroutine, Generic, Optional, TypeVar
+
+from taskorbit.dispatching.dispatcher import Dispatcher
+from taskorbit.enums import AckPolicy
+from taskorbit.metrics import Sample
+from taskorbit.models import ServiceMessage, Metadata
+from taskorbit.timer import Timer
+
+
+logger = logging.getLogger(__name__)
+
+DeliveryType = TypeVar("DeliveryType")
+
+
+async def _aenumerate(iterable: Iterable[Any] | AsyncIterable[Any]) -> AsyncIterator[tuple[int, Any]]:
+    """Enumerates both sync and async iterables"""
+    index = 0
+    if isinstance(iterable, AsyncIterable):
+        async for item in iterable:
+            yield index, item
+            index += 1
+    else:
+        for item in iterable:
+            yield index, item
+            index += 1
+
+
+class BaseBroker(ABC, Generic[DeliveryType]):
+    """
+    The protocol of the brokers. A broker publishes messages and feeds the received ones to the dispatcher.
+
+    A delivery is the received message as the broker knows it, for example `nats.aio.msg.Msg`. The broker decodes it
+    into `Message` or `ServiceMessage` and acknowledges it. The common processing is in `_processing`: service messages
+    are acked at once, messages are nak'ed when the dispatcher rejects them and acked according to the ack policy:
+
+        ACCEPT - when their tasks start, messages waiting in the scheduler are held until then. A crash of the worker
+            loses the started messages;
+        COMPLETE - when their tasks are done, failed ones are nak'ed with the default delay.
+
+    While a message is held, `in_progress` is sent every `heartbeat` seconds, so the backend does not redeliver it.
+
+    Args:
+        ack_policy (AckPolicy): When messages are acknowledged.
+        heartbeat (Optional[float]): The interval of `in_progress` of the held messages in seconds, none are sent if None.
+
+    Attributes:
+        draining (bool): Whether `drain` has been called, received messages are nak'ed for immediate redelivery.
+        held (dict[str, DeliveryType]): The deliveries of messages given to the dispatcher and not acknowledged yet, by uuid.
+    """
+    def __init__(self, ack_policy: AckPolicy = AckPolicy.ACCEPT, heartbeat: Optional[float] = None) -> None:
+        if heartbeat is not None and heartbeat <= 0:
+            raise ValueError(f"The `heartbeat` must be a positive number, but received {heartbeat}")
+
+        self.ack_policy = AckPolicy(ack_policy)
+        self.heartbeat = heartbeat
+        self.draining = False
+        self.held: dict[str, DeliveryType] = {}
+        self._consumers: list[asyncio.Task] = []
+        self._busy = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._settling: set[asyncio.Task] = set()
+        self._settled: Optional[Dispatcher] = None
+        self._callbacks: list[tuple[Callable, Callable]] = []
+        self._heartbeat_timer: Optional[Timer] = None
+
+    @abstractmethod
+    async def startup(self) -> None:
+        """Connects to the backend"""
+        ...
+
+    @abstractmethod
+    async def pub(self, data: dict[str, Any]) -> None:
+        """
+        Publishes a message.
+
+        Args:
+            data (dict[str, Any]): The data of a `Message` or a `ServiceMessage`.
+        """
+        ...
+
+    @abstractmethod
+    async def include_dispatcher(self, dp: Dispatcher) -> None:
+        """
+        Consumes messages and gives them to the dispatcher until cancelled.
+
+        Args:
+            dp (Dispatcher): The dispatcher that processes the messages.
+        """
+        ...
+
+    @abstractmethod
+    def decode(self, delivery: DeliveryType) -> Metadata:
+        """
+        Returns the typed message of the delivery.
+
+        :raises TypeError, ValueError: If the delivery does not fit the models, it is acked and dropped
+        """
+        ...
+
+    @abstractmethod
+    async def ack(self, delivery: DeliveryType) -> None:
+        """Acknowledges the delivery, it will not be delivered again"""
+        ...
+
+    @abstractmethod
+    async def nak(self, delivery: DeliveryType, delay: Optional[float] = None) -> None:
+        """
+        Rejects the delivery, it will be delivered again later.
+
+        Args:
+            delivery (DeliveryType): The rejected delivery.
+            delay (Optional[float]): The redelivery delay in seconds, the default of the broker if None, at once if 0.
+        """
+        ...
+
+    async def in_progress(self, delivery: DeliveryType) -> None:
+        """Tells the backend that the delivery is still being processed, so that it is not redelivered, see `AckPolicy.COMPLETE`"""
+        pass
+
+    async def skip(self, delivery: DeliveryType) -> None:
+        """Leaves the delivery unacknowledged while the dispatcher is full, the backend is expected to redeliver it"""
+        logger.debug("Queue is full, skipping message acknowledgment.")
+
+    def delivery_count(self, delivery: DeliveryType) -> int:
+        """Returns how many times the delivery has been delivered, used by the `redeliveries` metric"""
+        return 1
+
+    async def pub_many(self, messages: Iterable[dict[str, Any]] | AsyncIterable[dict[str, Any]], window: int = 256) -> dict[int, Exception]:
+        """
+        Publishes messages keeping up to `window` publishes waiting for the backend at the same time.
+        Messages are taken from the iterable only when there is room in the window, so an async generator can stream them.
+
+        Args:
+            messages (Iterable[dict[str, Any]] | AsyncIterable[dict[str, Any]]): The data to be published, see `pub`.
+            window (int): The maximum number of unconfirmed publishes in flight.
+
+        :return: The exceptions of the failed messages by their position in `messages`, empty if everything was published
+        """
+        if window < 1:
+            raise ValueError(f"The `window` must be a positive number, but received {window}")
+
+        failures: dict[int, Exception] = {}
+        semaphore = asyncio.Semaphore(window)
+        pending: set[asyncio.Task] = set()
+
+        async def _publish(index: int, data: dict[str, Any]) -> None:
+            try:
+                await self.pub(data)
+            except Exception as exc:
+                logger.error(f"Failed to publish message #{index}: {exc!r}")
+                failures[index] = exc
+            finally:
+                semaphore.release()
+
+        async for index, data in _aenumerate(messages):
+            await semaphore.acquire()
+            task = asyncio.create_task(_publish(index, data))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+        if pending:
+            await asyncio.gather(*pending)
+
+        return failures
+
+    async def drain(self, dp: Dispatcher, timeout: float) -> list[str]:
+        """
+        Stops consuming and lets the tasks of the dispatcher finish within the timeout, see `Dispatcher.drain`.
+        Messages received from now on and messages that have not started are nak'ed without a delay, so other workers get them
+        at once instead of after the redelivery timeout of the backend. With `AckPolicy.COMPLETE` the tasks still running
+        at the deadline are cancelled and nak'ed too. With `AckPolicy.ACCEPT` their messages have been acked, so they keep
+        running and are lost if the process exits before they finish. `include_dispatcher` returns once consuming has stopped.
+
+            left = await broker.drain(dp, timeout=25)
+
+        Args:
+            dp (Dispatcher): The dispatcher that processes the messages.
+            timeout (float): How long to wait for the running tasks, in seconds.
+
+        :return: The uuids of the messages that have been nak'ed
+        """
+        self.draining = True
+        while self._busy:
+            await self._idle.wait()
+
+        for consumer in self._consumers:
+            consumer.cancel()
+
+        left: list[str] = await dp.drain(timeout, cancel=self.ack_policy == AckPolicy.COMPLETE)
+        if self._settling:
+            await asyncio.gather(*self._settling, return_exceptions=True)
+        for uuid in left:
+            delivery = self.held.pop(uuid, None)
+            if delivery is not None:
+                await self.nak(delivery, delay=0)
+
+        self._detach()
+        logger.info(f"The broker has been drained, {len(left)} messages have been handed back")
+        return left
+
+    async def _consume(self, dp: Dispatcher, *consumers: Coroutine[Any, Any, None]) -> None:
+        """
+        Runs the consuming loops of `include_dispatcher` until they are cancelled. A cancellation by `drain` is a normal return.
+
+        Args:
+            dp (Dispatcher): The dispatcher that processes the messages.
+            *consumers (Coroutine[Any, Any, None]): The loops that receive deliveries and give them to `_processing`.
+
+        :return: None
+        """
+        if self._settled is not dp:
+            self._detach()
+            self._attach(dp.add_done_callback, dp.remove_done_callback, partial(self._settle, dp))
+            if self.ack_policy == AckPolicy.ACCEPT:
+                self._attach(dp.add_start_callback, dp.remove_start_callback, partial(self._start, dp))
+            self._settled = dp
+
+        self._consumers = [asyncio.create_task(consumer) for consumer in consumers]
+        try:
+            await asyncio.gather(*self._consumers)
+        except asyncio.CancelledError:
+            if not self.draining:
+                raise
+        finally:
+            for consumer in self._consumers:
+                consumer.cancel()
+            self._consumers = []
+            # while draining the tasks still settle through the callbacks, `drain` removes them at the end
+            if not self.draining:
+                self._detach()
+
+    def _attach(self, add: Callable, remove: Callable, callback: Callable) -> None:
+        add(callback)
+        self._callbacks.append((remove, callback))
+
+    def _detach(self) -> None:
+        """Removes the callbacks added to the dispatcher by `_consume`, so they do not pile up across brokers"""
+        for remove, callback in self._callbacks:
+            remove(callback)
+        self._callbacks = []
+        self._settled = None
+
+    async def _processing(self, dp: Dispatcher, delivery: DeliveryType) -> None:
+        """
+        Validates the received message and gives it to the dispatcher. While draining, the message is nak'ed for immediate redelivery.
+
+        Args:
+            dp (Dispatcher): The dispatcher that processes the message.
+            delivery (DeliveryType): The message received from the backend.
+
+        :return: None
+        """
+        self._busy += 1
+        self._idle.clear()
+        try:
+            if self.draining:
+                await self.nak(delivery, delay=0)
+            else:
+                await self._process(dp, delivery)
+        finally:
+            self._busy -= 1
+            if not self._busy:
+                self._idle.set()
+
+    async def _process(self, dp: Dispatcher, delivery: DeliveryType) -> None:
+        logger.debug(f"New msg! Is the queue full? - {dp.full}; {len(dp.pool)}")
+        start = perf_counter() if dp.metrics is not None else 0.0
+        try:
+            metadata: Metadata = self.decode(delivery)
+        except (TypeError, ValueError) as exc:
+            logger.error(f"The message cannot be decoded: {exc}")
+            await self.ack(delivery)
+            return
+
+        if dp.metrics is not None:
+            type_event: str = getattr(metadata, "type_event", "")
+            dp.metrics.observe("decode", "", type_event, perf_counter() - start)
+            if self.delivery_count(delivery) > 1:
+                dp.metrics.inc("redeliveries", "", type_event)
+
+        # SERVICE_MESSAGE
+        if isinstance(metadata, ServiceMessage):
+            await dp.listen(metadata=metadata)
+            await self.ack(delivery)
+            return
+
+        # MESSAGE
+        if dp.full:
+            await self.skip(delivery)
+            return
+
+        if metadata.uuid in self.held:
+            # A redelivery of a message that is still held, the original delivery settles it
+            logger.debug(f"The task-{metadata.uuid} is held by another delivery, the redelivery has been rejected")
+            await self.nak(delivery)
+            return
+
+        self.held[metadata.uuid] = delivery
+        try:
+            accepted: bool = await dp.listen(metadata=metadata)
+        except BaseException:
+            self.held.pop(metadata.uuid, None)
+            raise
+
+        if accepted:
+            # Held until `_start` or `_settle`, unless the task has started at once or the message has been dropped as a duplicate
+            if metadata.uuid in self.held:
+                self._arm_heartbeat(dp)
+            return
+
+        self.held.pop(metadata.uuid, None)
+        logger.debug(f"The task-{metadata.uuid} has been rejected by the dispatcher")
+        if dp.metrics is not None:
+            dp.metrics.inc("rejected", "", metadata.type_event)
+        await self.nak(delivery)
+
+    def _start(self, dp: Dispatcher, uuid: str) -> None:
+        """The start-callback of the dispatcher with `AckPolicy.ACCEPT`: acks the held delivery of the started task"""
+        delivery = self.held.pop(uuid, None)
+        if delivery is not None:
+            self._track(self._measured_ack(dp, delivery, dp.sample(uuid)))
+
+    def _settle(self, dp: Dispatcher, uuid: str, task: Optional[asyncio.Task]) -> None:
+        """
+        The done-callback of the dispatcher: acks the held delivery of a completed or closed message and of a duplicate
+        of a completed one, and naks the one of a failed message. With `AckPolicy.ACCEPT` only duplicates are still held here.
+        Tasks cancelled by `drain` stay held, `drain` naks them.
+        """
+        if task is not None and task.cancelled() and self.draining:
+            return
+
+        delivery = self.held.pop(uuid, None)
+        if delivery is None:
+            return
+
+        if task is not None and not task.cancelled() and task.exception() is not None:
+            self._track(self.nak(delivery))
+        else:
+            self._track(self._measured_ack(dp, delivery, dp.sample(uuid)))
+
+    def _track(self, coroutine: Coroutine[Any, Any, None]) -> None:
+        """Runs the ack or nak of a callback as a task, `drain` waits for them"""
+        settling = asyncio.create_task(coroutine)
+        self._settling.add(settling)
+        settling.add_done_callback(self._settling.discard)
+
+    def _arm_heartbeat(self, dp: Dispatcher) -> None:
+        """Arms the heartbeat of the held messages in the timer wheel of the dispatcher, one timer for all of them"""
+        if self.heartbeat is not None and self._heartbeat_timer is None:
+            self._heartbeat_timer = dp.timer_wheel.call_later(self.heartbeat, self._send_heartbeat, dp=dp)
+
+    async def _send_heartbeat(self, dp: Dispatcher) -> None:
+        self._heartbeat_timer = None
+        for delivery in list(self.held.values()):
+            try:
+                await self.in_progress(delivery)
+            except Exception as exc:
+                logger.warning(f"Failed to send in_progress: {exc!r}")
+
+        if self.held:
+            self._arm_heartbeat(dp)
+
+    async def _measured_ack(self, dp: Dispatcher, delivery: DeliveryType, sample: Optional[Sample]) -> None:
+        """Acknowledges the delivery, recording the duration with `Dispatcher(metrics=True)` in the sample of the message"""
+        if dp.metrics is None or sample is None:
+            await self.ack(delivery)
+            return
+
+        start = perf_counter()
+        await self.ack(delivery)
+        dp.metrics.observe_ack(sample, perf_counter() - start)
@@ -0,0 +1,141 @@
+import asyncio
+import itertools
+import logging
+from typing import Any, Optional
+
+from taskorbit.brokers.base import BaseBroker
+from taskorbit.dispatching.dispatcher import Dispatcher
+from taskorbit.enums import AckPolicy
+from taskorbit.models import Message, ServiceMessage, Metadata
+
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryDelivery:
+    """
+    A message waiting in the `MemoryBroker`.
+
+    Attributes:
+        metadata (Metadata): The message itself, it is not copied.
+        attempts (int): How many times the message has been delivered.
+    """
+    __slots__ = ("metadata", "attempts")
+
+    def __init__(self, metadata: Metadata) -> None:
+        self.metadata = metadata
+        self.attempts = 0
+
+
+class MemoryBroker(BaseBroker[MemoryDelivery]):
+    """
+    An in-process broker on an asyncio queue. Messages are handed to the dispatcher as the same `Message` objects
+    that were published, without serialization, so producers and consumers on the same loop, tests and benchmarks
+    run at in-process speed. Nothing is persisted.
+
+    Messages are delivered by priority, service messages first, and in the order of publishing within a priority.
+    The consumer takes a message only when the dispatcher can accept it.
+
+        broker = MemoryBroker()
+        consumer = asyncio.create_task(broker.include_dispatcher(dp))
+        await broker.pub(Message(uuid="1", type_event="EVENT"))
+
+    Args:
+        maxsize (int): The maximum number of waiting messages, `pub` waits for room when it is reached. Unlimited if 0.
+        nak_delay (float): The redelivery delay of messages that the dispatcher has rejected or that have failed, in seconds.
+        ack_policy (AckPolicy): When messages are acknowledged, with COMPLETE failed messages are redelivered, see `BaseBroker`.
+    """
+    def __init__(self, maxsize: int = 0, nak_delay: float = 1.0, ack_policy: AckPolicy = AckPolicy.ACCEPT) -> None:
+        super().__init__(ack_policy)
+        self.maxsize = maxsize
+        self.nak_delay = nak_delay
+        self.queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._redeliveries: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return self.queue.qsize() if self.queue is not None else 0
+
+    async def startup(self) -> None:
+        """Creates the queue, it is bound to the running loop"""
+        if self.queue is None:
+            self.queue = asyncio.PriorityQueue(self.maxsize)
+
+    async def pub(self, data: dict[str, Any] | Metadata) -> None:
+        """
+        Publishes a message.
+
+        Args:
+            data (dict[str, Any] | Metadata): A `Message` or a `ServiceMessage`, or their data that is validated here.
+
+        :raises TypeError: If the data fits neither model
+        """
+        if isinstance(data, dict):
+            if ServiceMessage.validate_fields(data.keys()):
+                data = ServiceMessage(**data)
+            elif Message.validate_fields(data.keys()):
+                data = Message(**data)
+            else:
+                raise TypeError(f"The message has an unknown format: {set(data.keys())}")
+        elif not isinstance(data, (Message, ServiceMessage)):
+            raise TypeError(f"The message must be a Message, a ServiceMessage or a dict, but received {type(data).__name__}")
+
+        await self.startup()
+        await self._put(MemoryDelivery(data))
+
+    async def _put(self, delivery: MemoryDelivery) -> None:
+        metadata = delivery.metadata
+        priority = float("inf") if isinstance(metadata, ServiceMessage) else metadata.priority
+        await self.queue.put((-priority, next(self._sequence), delivery))
+
+    def decode(self, delivery: MemoryDelivery) -> Metadata:
+        return delivery.metadata
+
+    async def ack(self, delivery: MemoryDelivery) -> None:
+        pass
+
+    async def nak(self, delivery: MemoryDelivery, delay: Optional[float] = None) -> None:
+        """Puts the message back into the queue in `delay` seconds, `nak_delay` if None"""
+        delay = self.nak_delay if delay is None else delay
+        if not delay:
+            await self._put(delivery)
+            return
+
+        async def _redeliver() -> None:
+            await asyncio.sleep(delay)
+            await self._put(delivery)
+
+        task = asyncio.create_task(_redeliver())
+        self._redeliveries.add(task)
+        task.add_done_callback(self._redeliveries.discard)
+
+    async def skip(self, delivery: MemoryDelivery) -> None:
+        """There is no redelivery timeout in memory, so the skipped message is redelivered like a rejected one"""
+        await self.nak(delivery)
+
+    def delivery_count(self, delivery: MemoryDelivery) -> int:
+        return delivery.attempts
+
+    async def include_dispatcher(self, dp: Dispatcher) -> None:
+        """
+        Gives the messages to the dispatcher until cancelled or drained, see `drain`.
+
+        Args:
+            dp (Dispatcher): The dispatcher that processes the messages.
+
+        :return: None
+        """
+        if not isinstance(dp, Dispatcher):
+            raise TypeError(f"The `dp` must be an instance of Dispatcher, but received {type(dp).__name__}")
+
+        await self.startup()
+
+        async def _consume() -> None:
+            while True:
+                await dp.wait_free()
+
+                *_, delivery = await self.queue.get()
+                delivery.attempts += 1
+                await self._processing(dp, delivery)
+
+        await self._consume(dp, _consume())
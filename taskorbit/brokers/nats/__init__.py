@@ -1,5 +1,6 @@
 from .client import NatsBroker
 from .configuration import NatsConfiguration
+from .dedup import NatsKVDeduplicator
 
 
-__all__ = ['NatsBroker', 'NatsConfiguration']
+__all__ = ['NatsBroker', 'NatsConfiguration', 'NatsKVDeduplicator']
@@ -1,20 +1,30 @@
-from typing import Optional, Any
+import asyncio
+import uuid
+from functools import partial
+from typing import Optional, Any, Iterable
 
 import nats
 import logging
+from ormsgpack import ormsgpack
 from nats.aio.client import Client
+from nats.aio.msg import Msg
+from nats.aio.subscription import Subscription
+from nats.errors import Error as NatsError, TimeoutError as NatsTimeoutError, NotJSMessageError
 from nats.js import JetStreamContext
+from nats.js.api import ConsumerConfig
 from nats.js.errors import NotFoundError, NoStreamResponseError
-from ormsgpack import ormsgpack
-
+from taskorbit.brokers.base import BaseBroker
+from taskorbit.brokers.nats.codecs import Codec, Compression, get_codec, get_compression
 from taskorbit.brokers.nats.configuration import NatsConfiguration
+from taskorbit.brokers.nats.serialization import encode_message, decode_message, encode_response
 from taskorbit.dispatching.dispatcher import Dispatcher
-from taskorbit.models import Message, ServiceMessage
+from taskorbit.enums import Commands, TaskStatus
+from taskorbit.models import Metadata, ServiceMessage
 
 logger = logging.getLogger(__name__)
 
 
-class NatsBroker:
+class NatsBroker(BaseBroker[Msg]):
     """
     NatsBroker is an implementation of a client broker that uses NATS.
 
@@ -23,38 +33,58 @@ class NatsBroker:
         or an instance of the NatsConfiguration class.
 
     Attributes:
+        client (Optional[Client]): The NATS connection.
         jetstream (Optional[JetStreamContext]): You will need the JetStream context to make any JetStream enabled
         operation.
     """
+    client: Optional[Client]
     jetstream: Optional[JetStreamContext]
 
     def __init__(self, config: dict[str, str] | NatsConfiguration) -> None:
         if isinstance(config, dict):
             config = NatsConfiguration(**config)
 
+        super().__init__(config.ack_policy, config.get_heartbeat())
         self.config = config
+        self.client = None
+        self.jetstream = None
+        self._subscriptions: list[Subscription] = []
+        self.codec: Codec = get_codec(config.codec)
+        self.compression: Optional[Compression] = get_compression(config.compression)
 
     async def startup(self) -> None:
         """
         Connects to NATS and creates a JetStream context.
         """
-        nats_connect: Client = await nats.connect(self.config.url)
-        self.jetstream: JetStreamContext = nats_connect.jetstream()
+        self.client = await nats.connect(self.config.url)
+        self.jetstream: JetStreamContext = self.client.jetstream()
 
     async def pub(self, data: dict[str, Any]) -> None:
         """
         Publishes a message to NATS.
 
         Args:
-            data (dict[str, Any]): The data to be published. The data will be serialized using ormsgpack.
+            data (dict[str, Any]): The data to be published. The data will be serialized with `config.codec`, compressed above
+                `config.compression_threshold` and tagged with its kind, see `taskorbit.brokers.nats.serialization.encode_message`.
+                The subject is chosen by the `priority` of the data, see `NatsConfiguration.priority_subjects`.
 
         :return: None
         """
+        payload, headers = encode_message(
+            data,
+            pack_data=self.config.pack_data,
+            codec=self.codec,
+            compression=self.compression,
+            compression_threshold=self.config.compression_threshold,
+        )
+        subject = self.config.get_subject(data.get("priority", 0))
+
         async def _publish():
             await self.jetstream.publish(
                 stream=self.config.stream,
-                subject=self.config.subject,
-                payload=ormsgpack.packb(data),
+                subject=subject,
+                payload=payload,
+                headers=headers,
             )
 
         try:
@@ -63,16 +93,98 @@ class NatsBroker:
             await self._creating_stream()
             await _publish()
 
-    async def _get_subscriber(self) -> JetStreamContext.PushSubscription:
+    async def request(self, command: Commands, uuids: Iterable[str], timeout: float = 1.0) -> dict[str, dict[str, Any]]:
+        """
+        Sends a service command for many tasks in one request and gathers the answers of all workers, see `Dispatcher.service`.
+        Each worker answers only for the tasks it knows, so the request waits until every task is known or the timeout expires.
+
+            statuses = await broker.request(Commands.GET_STATUS, ["uuid-1", "uuid-2"])
+            statuses["uuid-1"]["status"]  # "COMPLETED"
+
+        Args:
+            command (Commands): The command, GET_STATUS or CLOSING.
+            uuids (Iterable[str]): The uuids of the tasks.
+            timeout (float): How long to wait for the answers, in seconds.
+
+        :return: The statuses by uuid, UNKNOWN for the tasks that no worker knows
+        """
+        if self.config.service_subject is None:
+            raise RuntimeError("The `service_subject` is not configured")
+        if self.client is None:
+            await self.startup()
+
+        uuids = list(uuids)
+        pending = set(uuids)
+        statuses: dict[str, dict[str, Any]] = {}
+        answered = asyncio.Event()
+
+        async def _collect(msg: Msg) -> None:
+            for task in ormsgpack.unpackb(msg.data)["tasks"]:
+                statuses[task["uuid"]] = task
+                pending.discard(task["uuid"])
+            if not pending:
+                answered.set()
+
+        inbox = self.client.new_inbox()
+        subscription = await self.client.subscribe(inbox, cb=_collect)
+        try:
+            payload, headers = encode_message({"uuid": uuid.uuid4().hex, "command": Commands(command).value, "uuids": uuids})
+            await self.client.publish(self.config.service_subject, payload, reply=inbox, headers=headers)
+            try:
+                await asyncio.wait_for(answered.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            await subscription.unsubscribe()
+
+        for task_uuid in pending:
+            statuses[task_uuid] = {
+                "uuid": task_uuid, "status": TaskStatus.UNKNOWN.value, "started_at": None, "elapsed": None, "result": None, "exception": None
+            }
+
+        return statuses
+
+    async def _reply_service(self, dp: Dispatcher, msg: Msg) -> None:
+        """
+        Answers a service request with the statuses of the tasks known to this worker, see `request`.
+
+        Args:
+            dp (Dispatcher): The dispatcher that executes the command.
+            msg (Msg): The request.
+
+        :return: None
+        """
+        try:
+            metadata: Metadata = decode_message(msg.data, msg.headers)
+        except (TypeError, ValueError) as exc:
+            logger.error(f"The service request cannot be decoded: {exc}")
+            return
+
+        if not isinstance(metadata, ServiceMessage):
+            logger.error(f"The service request must be a service message, but received {type(metadata).__name__}")
+            return
+
+        response = await dp.service(metadata)
+        known = [task for task in response["tasks"] if task["status"] != TaskStatus.UNKNOWN]
+        if known and msg.reply:
+            await msg.respond(encode_response({"tasks": known}))
+
+    async def _get_subscriber(self, subject: Optional[str] = None, durable: Optional[str] = None) -> JetStreamContext.PushSubscription:
         """
         Returns a JetStream push subscription.
 
+        Args:
+            subject (Optional[str]): The subject of the subscription, `config.subject` if None.
+            durable (Optional[str]): The durable of the subscription, `config.durable` if None.
+
         :return: JetStreamContext.PushSubscription
         """
         return await self.jetstream.subscribe(
             stream=self.config.stream,
-            subject=self.config.subject,
-            durable=self.config.durable,
+            subject=subject or self.config.subject,
+            durable=durable or self.config.durable,
+            queue=self.config.queue,
+            config=ConsumerConfig(ack_wait=self.config.ack_wait),
         )
 
     async def _creating_stream(self) -> None:
@@ -81,26 +193,164 @@ class NatsBroker:
 
         :return: None
         """
-        await self.jetstream.add_stream(name=self.config.stream, subjects=[self.config.subject])
+        subjects = [subject for _, subject, _ in self.config.get_subjects()]
+        await self.jetstream.add_stream(name=self.config.stream, subjects=subjects)
 
-    async def _builder_subscriber(self) -> JetStreamContext.PushSubscription:
+    async def _builder_subscriber(self, subject: Optional[str] = None, durable: Optional[str] = None) -> JetStreamContext.PushSubscription:
         """
         Returns a JetStream push subscription. If the stream does not exist, it will be created. If JetStream is not initialized, raises an error.
 
+        Args:
+            subject (Optional[str]): The subject of the subscription, `config.subject` if None.
+            durable (Optional[str]): The durable of the subscription, `config.durable` if None.
+
         :return: JetStreamContext.PushSubscription
         """
         if self.jetstream is None:
             raise RuntimeError("JetStream is not initialized")
 
         try:
-            return await self._get_subscriber()
+            return await self._get_subscriber(subject, durable)
         except NotFoundError:
             await self._creating_stream()
-            return await self._get_subscriber()
+            return await self._get_subscriber(subject, durable)
+
+    async def _get_pull_subscriber(self, subject: Optional[str] = None, durable: Optional[str] = None) -> JetStreamContext.PullSubscription:
+        """
+        Returns a JetStream pull subscription.
+
+        Args:
+            subject (Optional[str]): The subject of the subscription, `config.subject` if None.
+            durable (Optional[str]): The durable of the subscription, `config.durable` if None.
+
+        :return: JetStreamContext.PullSubscription
+        """
+        return await self.jetstream.pull_subscribe(
+            stream=self.config.stream,
+            subject=subject or self.config.subject,
+            durable=durable or self.config.durable,
+            config=ConsumerConfig(max_waiting=self.config.max_waiting, ack_wait=self.config.ack_wait),
+        )
+
+    async def _builder_pull_subscriber(self, subject: Optional[str] = None, durable: Optional[str] = None) -> JetStreamContext.PullSubscription:
+        """
+        Returns a JetStream pull subscription. If the stream does not exist, it will be created. If JetStream is not initialized, raises an error.
+
+        Args:
+            subject (Optional[str]): The subject of the subscription, `config.subject` if None.
+            durable (Optional[str]): The durable of the subscription, `config.durable` if None.
+
+        :return: JetStreamContext.PullSubscription
+        """
+        if self.jetstream is None:
+            raise RuntimeError("JetStream is not initialized")
+
+        try:
+            return await self._get_pull_subscriber(subject, durable)
+        except NotFoundError:
+            await self._creating_stream()
+            return await self._get_pull_subscriber(subject, durable)
+
+    def decode(self, delivery: Msg) -> Metadata:
+        """
+        Deserializes the NATS message, see `taskorbit.brokers.nats.serialization.decode_message`.
+
+        :raises TypeError, ValueError: If the payload does not fit the models
+        """
+        return decode_message(delivery.data, delivery.headers, defer_data=self.config.defer_data)
+
+    async def ack(self, delivery: Msg) -> None:
+        await delivery.ack()
+
+    async def nak(self, delivery: Msg, delay: Optional[float] = None) -> None:
+        """Rejects the message, the server redelivers it in `delay` seconds, `config.nak_delay` if None"""
+        await delivery.nak(delay=self.config.nak_delay if delay is None else delay)
+
+    async def drain(self, dp: Dispatcher, timeout: float) -> list[str]:
+        """
+        Unsubscribes the push and service subscriptions, so no new messages arrive, and drains the dispatcher, see
+        `BaseBroker.drain`. The messages still buffered by the push subscriptions are nak'ed without a delay, then the acks
+        and naks are flushed to the server.
+        """
+        self.draining = True
+        subscriptions, self._subscriptions = self._subscriptions, []
+        for subscription in subscriptions:
+            try:
+                await subscription.unsubscribe()
+            except NatsError as exc:
+                logger.error(f"The subscription to {subscription.subject} cannot be removed: {exc!r}")
+
+        left: list[str] = await super().drain(dp, timeout)
+
+        handed_back = 0
+        for subscription in subscriptions:
+            if not isinstance(subscription, JetStreamContext.PushSubscription):
+                continue
+
+            while subscription.pending_msgs:
+                try:
+                    msg: Msg = await subscription.next_msg(timeout=0.1)
+                except NatsError:
+                    break
+                await self.nak(msg, delay=0)
+                handed_back += 1
+
+        if handed_back:
+            logger.info(f"{handed_back} buffered messages have been handed back")
+
+        if self.client is not None and self.client.is_connected:
+            await self.client.flush()
+
+        return left
+
+    async def in_progress(self, delivery: Msg) -> None:
+        """Resets the ack_wait timer of the message on the server"""
+        await delivery.in_progress()
+
+    def delivery_count(self, delivery: Msg) -> int:
+        try:
+            return delivery.metadata.num_delivered
+        except (NotJSMessageError, AttributeError, TypeError):
+            return 1
+
+    async def _pull_messages(self, dp: Dispatcher) -> None:
+        """
+        Fetches messages in batches sized to the free slots of the dispatcher. While the pool is full, nothing is fetched,
+        so the server keeps the messages instead of redelivering them after ack_wait. Once draining, nothing is fetched and
+        the rest of the fetched batch is nak'ed, see `drain`.
+
+        With `priority_subjects` the subjects are fetched from the highest priority, a lower priority is fetched only
+        when all higher ones are empty.
+
+        Args:
+            dp (Dispatcher): The dispatcher that processes the messages.
+
+        :return: None
+        """
+        subscribers: list[JetStreamContext.PullSubscription] = [
+            await self._builder_pull_subscriber(subject, durable) for _, subject, durable in self.config.get_subjects()
+        ]
+        timeout = self.config.fetch_timeout if len(subscribers) == 1 else self.config.priority_fetch_timeout
+
+        while not self.draining:
+            await dp.wait_free()
+
+            for subscriber in subscribers:
+                free: Optional[int] = dp.free
+                batch = self.config.batch_size if free is None else min(self.config.batch_size, free)
+                try:
+                    messages: list[Msg] = await subscriber.fetch(batch=batch, timeout=timeout)
+                except NatsTimeoutError:
+                    continue
+
+                for msg in messages:
+                    await self._processing(dp, msg)
+                break
 
     async def include_dispatcher(self, dp: Dispatcher) -> None:
         """
         Adds a dispatcher to the broker's client for wiretapping. Messages that fit the data model will be given to it for subsequent detection of the handler.
+        Consumes until cancelled or drained, see `drain`.
 
         Args:
             dp (Dispatcher): The dispatcher to be added.
@@ -113,43 +363,25 @@ class NatsBroker:
         if self.jetstream is None:
             await self.startup()
 
-        subscriber: JetStreamContext.PushSubscription = await self._builder_subscriber()
-
-        async for msg in subscriber.messages:
-            logger.debug(f"New msg! Is the queue full? - {dp.pool.full}; {len(dp.pool)}")
-            data: dict[str, Any] | int = ormsgpack.unpackb(msg.data)
-
-            if isinstance(data, int):
-                logger.warning(f"The message has an unknown format: {data}")
-            else:
-                fields_data = set(data.keys())
-                is_service_message = ServiceMessage.validate_fields(fields_data)
-
-                # SERVICE_MESSAGE
-                if is_service_message:
-                    try:
-                        metadata: ServiceMessage = ServiceMessage(**data)
-                        await dp.listen(metadata=metadata)
-                    except TypeError as exc:
-                        logger.error(f"TypeError: {exc}")
-                    await msg.ack()
-                    continue
+        if self.config.service_subject is not None:
+            self._subscriptions.append(
+                await self.client.subscribe(self.config.service_subject, cb=partial(self._reply_service, dp))
+            )
+
+        if self.config.pull_mode:
+            await self._consume(dp, self._pull_messages(dp))
+            return
+
+        subscribers: list[JetStreamContext.PushSubscription] = [
+            await self._builder_subscriber(subject, durable) for _, subject, durable in self.config.get_subjects()
+        ]
+        self._subscriptions.extend(subscribers)
+
+        async def _consume(subscriber: JetStreamContext.PushSubscription) -> None:
+            async for msg in subscriber.messages:
+                await self._processing(dp, msg)
 
-                # MESSAGE
-                if not dp.pool.full:
-                    try:
-                        if Message.validate_fields(fields_data):
-                            metadata: Message = Message(**data)
-                        else:
-                            raise TypeError(f"The message has an unknown format: {fields_data}")
-
-                        await dp.listen(metadata=metadata)
-                    except TypeError as exc:
-                        logger.error(f"TypeError: {exc}")
-
-                    await msg.ack()
-                else:
-                    logger.debug("Queue is full, skipping message acknowledgment.")
+        await self._consume(dp, *(_consume(subscriber) for subscriber in subscribers))
 
 
 async def nats_broker(config: dict[str, str] | NatsConfiguration) -> NatsBroker:
@@ -0,0 +1,125 @@
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from ormsgpack import ormsgpack
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Codec:
+    """
+    Serializes the payload of NATS messages, the name is sent in the `Taskorbit-Codec` header.
+
+    Args:
+        name (str): The name of the codec in the header.
+        dumps (Callable[[Any], bytes]): Serializes a dict.
+        loads (Callable[[bytes | memoryview], Any]): Deserializes the payload.
+        binary (bool): Whether bytes can be embedded in the payload. The separately packed `data` is embedded as bytes,
+            otherwise as a UTF-8 string, see `NatsConfiguration.pack_data`.
+    """
+    name: str
+    dumps: Callable[[Any], bytes]
+    loads: Callable[[bytes | memoryview], Any]
+    binary: bool = True
+
+
+@dataclass(frozen=True, slots=True)
+class Compression:
+    """
+    Compresses payloads above the threshold, the name is sent in the `Taskorbit-Compression` header.
+
+    Args:
+        name (str): The name of the compression in the header.
+        compress (Callable[[bytes], bytes]): Compresses the payload.
+        decompress (Callable[[bytes | memoryview], bytes]): Decompresses the payload.
+    """
+    name: str
+    compress: Callable[[bytes], bytes]
+    decompress: Callable[[bytes | memoryview], bytes]
+
+
+MSGPACK = Codec("msgpack", ormsgpack.packb, ormsgpack.unpackb)
+
+
+def _orjson() -> Codec:
+    try:
+        import orjson
+    except ImportError as exc:
+        raise ImportError("The `json` codec requires orjson, install it with `pip install taskorbit[orjson]`") from exc
+
+    return Codec("json", orjson.dumps, orjson.loads, binary=False)
+
+
+def _zstd() -> Compression:
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise ImportError("The `zstd` compression requires zstandard, install it with `pip install taskorbit[zstd]`") from exc
+
+    return Compression("zstd", zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress)
+
+
+def _lz4() -> Compression:
+    try:
+        import lz4.frame
+    except ImportError as exc:
+        raise ImportError("The `lz4` compression requires lz4, install it with `pip install taskorbit[lz4]`") from exc
+
+    return Compression("lz4", lz4.frame.compress, lz4.frame.decompress)
+
+
+_codecs: dict[str, Codec] = {MSGPACK.name: MSGPACK}
+_codec_factories: dict[str, Callable[[], Codec]] = {"json": _orjson}
+_compressions: dict[str, Compression] = {}
+_compression_factories: dict[str, Callable[[], Compression]] = {"zstd": _zstd, "lz4": _lz4}
+
+
+def register_codec(codec: Codec) -> None:
+    """Adds a codec to the registry, producers and consumers must register it under the same name"""
+    _codecs[codec.name] = codec
+
+
+def register_compression(compression: Compression) -> None:
+    """Adds a compression to the registry, producers and consumers must register it under the same name"""
+    _compressions[compression.name] = compression
+
+
+def get_codec(name: str) -> Codec:
+    """
+    Returns the codec by its name, the optional dependencies of the built-in codecs are imported on the first use.
+
+    :raises ValueError: If there is no such codec
+    :raises ImportError: If the dependency of the codec is not installed
+    """
+    codec = _codecs.get(name)
+    if codec is None:
+        factory = _codec_factories.get(name)
+        if factory is None:
+            raise ValueError(f"Unknown codec {name!r}, the registered codecs are {', '.join(sorted({*_codecs, *_codec_factories}))}")
+        codec = _codecs[name] = factory()
+
+    return codec
+
+
+def get_compression(name: Optional[str]) -> Optional[Compression]:
+    """
+    Returns the compression by its name, None if the name is None.
+
+    :raises ValueError: If there is no such compression
+    :raises ImportError: If the dependency of the compression is not installed
+    """
+    if name is None:
+        return None
+
+    compression = _compressions.get(name)
+    if compression is None:
+        factory = _compression_factories.get(name)
+        if factory is None:
+            names = ", ".join(sorted({*_compressions, *_compression_factories}))
+            raise ValueError(f"Unknown compression {name!r}, the registered compressions are {names}")
+        compression = _compressions[name] = factory()
+
+    return compression
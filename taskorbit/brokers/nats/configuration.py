@@ -1,4 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Optional
+
+from taskorbit.enums import AckPolicy
 
 
 @dataclass
@@ -11,8 +14,71 @@ class NatsConfiguration:
         stream (str): The name of the NATS stream.
         subject (str): The name of the NATS subject.
         durable (str): The name of the NATS durable.
+        pull_mode (bool): Use a pull consumer that fetches only as many messages as there are free slots in the dispatcher pool.
+        batch_size (int): The maximum number of messages requested by one fetch in pull mode.
+        fetch_timeout (float): How long a fetch waits for messages in pull mode, in seconds.
+        max_waiting (Optional[int]): The maximum number of pull requests waiting on the consumer, the server default if None.
+        queue (Optional[str]): The deliver group of the push consumer, required when several workers share the durable in push mode.
+        pack_data (bool): Publish the `data` of messages serialized separately, so that consumers can defer its deserialization.
+        defer_data (bool): Deserialize the packed `data` of received messages only when it is accessed, see `DeferredMessage`.
+        nak_delay (float): The redelivery delay of messages that the dispatcher has rejected and, with `AckPolicy.COMPLETE`, of failed ones, in seconds.
+        priority_subjects (dict[int, str]): The subjects of messages by their priority, the other messages are published to `subject`.
+            Each subject has its own consumer, and in pull mode the higher priorities are fetched first.
+        priority_fetch_timeout (float): How long a fetch waits for messages of each subject in pull mode when `priority_subjects` is set.
+        service_subject (Optional[str]): The core NATS subject on which the workers answer service requests, see `NatsBroker.request`.
+        ack_policy (AckPolicy): Ack messages when their tasks start or when they are done, see `BaseBroker`.
+        ack_wait (Optional[float]): The redelivery timeout of unacknowledged messages set on the consumers, in seconds,
+            the server default (30s) if None.
+        heartbeat (Optional[float]): The interval of `in_progress` of the held messages, in seconds, a third of `ack_wait` if None.
+            Messages are held while they wait in the scheduler and, with `AckPolicy.COMPLETE`, until their tasks are done.
+        codec (str): The codec of published messages, "msgpack" or "json", see `taskorbit.brokers.nats.codecs.register_codec`.
+            Consumers decode every message with the codec named in its header.
+        compression (Optional[str]): Compress published payloads with "zstd" or "lz4", not compressed if None.
+        compression_threshold (int): The minimum size of a compressed payload in bytes, smaller payloads are sent as they are.
     """
     url: str
     stream: str
     subject: str
     durable: str
+    pull_mode: bool = False
+    batch_size: int = 10
+    fetch_timeout: float = 5.0
+    max_waiting: Optional[int] = None
+    queue: Optional[str] = None
+    pack_data: bool = False
+    defer_data: bool = False
+    nak_delay: float = 1.0
+    priority_subjects: dict[int, str] = field(default_factory=dict)
+    priority_fetch_timeout: float = 0.1
+    service_subject: Optional[str] = None
+    ack_policy: AckPolicy = AckPolicy.ACCEPT
+    ack_wait: Optional[float] = None
+    heartbeat: Optional[float] = None
+    codec: str = "msgpack"
+    compression: Optional[str] = None
+    compression_threshold: int = 1024
+
+    def get_subjects(self) -> list[tuple[int, str, str]]:
+        """
+        Returns the subjects with their priorities and durables, the highest priority first.
+
+        :return: list[tuple[int, str, str]]
+        """
+        subjects = [(0, self.subject, self.durable)]
+        subjects.extend(
+            (priority, subject, f"{self.durable}_priority_{priority}".replace("-", "_minus_"))
+            for priority, subject in self.priority_subjects.items()
+            if subject != self.subject
+        )
+        return sorted(subjects, key=lambda item: -item[0])
+
+    def get_heartbeat(self) -> float:
+        """Returns the interval of `in_progress` of the held messages"""
+        if self.heartbeat is not None:
+            return self.heartbeat
+
+        return (30.0 if self.ack_wait is None else self.ack_wait) / 3
+
+    def get_subject(self, priority: int) -> str:
+        """Returns the subject to which a message of the priority is published"""
+        return self.priority_subjects.get(priority, self.subject)
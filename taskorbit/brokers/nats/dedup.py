@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from typing import Optional
+
+from nats.js import JetStreamContext
+from nats.js.api import KeyValueConfig
+from nats.js.errors import BucketNotFoundError, KeyWrongLastSequenceError, InvalidKeyError
+from nats.js.kv import KeyValue
+
+from taskorbit.dispatching.dedup import BaseDeduplicator, MemoryDeduplicator
+
+
+logger = logging.getLogger(__name__)
+
+RUNNING = b"running"
+COMPLETED = b"completed"
+
+
+class NatsKVDeduplicator(BaseDeduplicator):
+    """
+    A deduplicator persisted in a NATS KV bucket, shared by all workers and kept across restarts.
+    The bucket TTL bounds how long uuids are remembered. A local `MemoryDeduplicator` in front of it answers
+    for the uuids seen by this worker without a round-trip. Only the uuids marked as completed in the bucket are
+    remembered locally, a running marker may be left by a crashed worker, so its duplicates are rejected, not dropped.
+    While the bucket is unavailable, only the local deduplication applies.
+
+        dp = Dispatcher(max_pool_size=10, dedup=NatsKVDeduplicator(broker.jetstream, bucket="TASKS_DEDUP"))
+
+    Args:
+        jetstream (JetStreamContext): The JetStream context, for example `NatsBroker.jetstream` after `startup`.
+        bucket (str): The name of the KV bucket, it is created if it does not exist.
+        ttl (float): How long uuids are remembered, in seconds.
+        local (Optional[MemoryDeduplicator]): The local cache, one with the same TTL is created if None.
+    """
+    def __init__(self, jetstream: JetStreamContext, bucket: str, ttl: float = 300.0, local: Optional[MemoryDeduplicator] = None) -> None:
+        self.jetstream = jetstream
+        self.bucket = bucket
+        self.ttl = ttl
+        self.local = local if local is not None else MemoryDeduplicator(ttl=ttl)
+        self._kv: Optional[KeyValue] = None
+        self._writes: set[asyncio.Task] = set()
+
+    async def _get_kv(self) -> KeyValue:
+        if self._kv is None:
+            try:
+                self._kv = await self.jetstream.key_value(self.bucket)
+            except BucketNotFoundError:
+                self._kv = await self.jetstream.create_key_value(config=KeyValueConfig(bucket=self.bucket, ttl=self.ttl))
+
+        return self._kv
+
+    async def claim(self, uuid: str) -> bool:
+        if not self.local.claim_nowait(uuid):
+            return False
+
+        try:
+            await (await self._get_kv()).create(uuid, RUNNING)
+        except KeyWrongLastSequenceError:
+            self.local.release(uuid)
+            if await self._is_completed(uuid):
+                logger.debug(f"The task-{uuid} has completed on another worker")
+                self.local.complete(uuid)
+            else:
+                logger.debug(f"The task-{uuid} is running on another worker")
+            return False
+        except InvalidKeyError:
+            logger.warning(f"The uuid {uuid!r} cannot be a NATS KV key, only the local deduplication applies to it")
+        except Exception as exc:
+            # The message runs with the local claim, it completes or releases it like any other
+            logger.warning(f"The bucket {self.bucket!r} is unavailable, only the local deduplication applies to the task-{uuid}: {exc!r}")
+
+        return True
+
+    async def _is_completed(self, uuid: str) -> bool:
+        try:
+            entry = await (await self._get_kv()).get(uuid)
+        except Exception as exc:
+            logger.debug(f"Failed to read the marker of the task-{uuid}: {exc!r}")
+            return False
+
+        return entry.value == COMPLETED
+
+    def completed(self, uuid: str) -> bool:
+        return self.local.completed(uuid)
+
+    def _write(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _put(self, uuid: str) -> None:
+        try:
+            await (await self._get_kv()).put(uuid, COMPLETED)
+        except Exception as exc:
+            logger.error(f"Failed to mark the task-{uuid} as completed: {exc!r}")
+
+    async def _delete(self, uuid: str) -> None:
+        try:
+            await (await self._get_kv()).delete(uuid)
+        except Exception as exc:
+            logger.error(f"Failed to release the task-{uuid}: {exc!r}")
+
+    def complete(self, uuid: str) -> None:
+        self.local.complete(uuid)
+        self._write(self._put(uuid))
+
+    def release(self, uuid: str) -> None:
+        self.local.release(uuid)
+        self._write(self._delete(uuid))
@@ -0,0 +1,135 @@
+from typing import Any, Optional
+
+from ormsgpack import ormsgpack
+
+from taskorbit.brokers.nats.codecs import MSGPACK, Codec, Compression, get_codec, get_compression
+from taskorbit.models import Message, ServiceMessage, DeferredMessage, Metadata
+
+
+KIND_HEADER = "Taskorbit-Kind"
+DATA_HEADER = "Taskorbit-Data"
+CODEC_HEADER = "Taskorbit-Codec"
+COMPRESSION_HEADER = "Taskorbit-Compression"
+
+KIND_MESSAGE = "message"
+KIND_SERVICE = "service"
+DATA_PACKED = "packed"
+
+
+def message_kind(data: dict[str, Any]) -> Optional[str]:
+    """
+    Classifies the data by its keys. Used on the producer side and for messages published without the kind header.
+
+    :return: KIND_MESSAGE, KIND_SERVICE or None if the data fits neither model
+    """
+    keys = data.keys()
+    if ServiceMessage.validate_fields(keys):
+        return KIND_SERVICE
+    if Message.validate_fields(keys):
+        return KIND_MESSAGE
+
+    return None
+
+
+def encode_message(
+    data: dict[str, Any],
+    pack_data: bool = False,
+    codec: Codec = MSGPACK,
+    compression: Optional[Compression] = None,
+    compression_threshold: int = 1024,
+) -> tuple[bytes, dict[str, str]]:
+    """
+    Serializes the data of a message and tags it with the kind and codec headers, so the consumer does not have to probe
+    the keys or the format.
+
+    Args:
+        data (dict[str, Any]): The data of a `Message` or a `ServiceMessage`.
+        pack_data (bool): Serialize the `data` of a `Message` separately, so the consumer can defer its deserialization.
+        codec (Codec): The codec of the payload, see `taskorbit.brokers.nats.codecs`.
+        compression (Optional[Compression]): Compresses payloads of at least `compression_threshold` bytes, tagged with
+            the compression header.
+        compression_threshold (int): The minimum size of a compressed payload in bytes.
+
+    :return: The payload and the headers
+    """
+    kind = message_kind(data)
+    headers: dict[str, str] = {CODEC_HEADER: codec.name}
+    if kind is not None:
+        headers[KIND_HEADER] = kind
+
+    if pack_data and kind == KIND_MESSAGE and data.get("data") is not None:
+        packed = codec.dumps(data["data"])
+        data = {**data, "data": packed if codec.binary else packed.decode()}
+        headers[DATA_HEADER] = DATA_PACKED
+
+    payload: bytes = codec.dumps(data)
+    if compression is not None and len(payload) >= compression_threshold:
+        payload = compression.compress(payload)
+        headers[COMPRESSION_HEADER] = compression.name
+
+    return payload, headers
+
+
+def decode_message(payload: bytes | memoryview, headers: Optional[dict[str, str]] = None, defer_data: bool = False) -> Metadata:
+    """
+    Deserializes the payload straight into `Message` or `ServiceMessage`. The compression and the codec are chosen by their
+    headers, payloads without the codec header are msgpack. The model is chosen by the kind header, messages of producers
+    that do not set it are classified by their keys.
+
+    Args:
+        payload (bytes | memoryview): The raw payload of the NATS message.
+        headers (Optional[dict[str, str]]): The headers of the NATS message.
+        defer_data (bool): Keep the packed `data` serialized until it is accessed, see `DeferredMessage`.
+
+    :return: The typed message
+    :raises TypeError: If the payload does not fit the models
+    :raises ValueError: If the payload cannot be decompressed or deserialized, or its codec or compression is unknown
+        or its dependency is not installed
+    """
+    headers = headers or {}
+    try:
+        compression = get_compression(headers.get(COMPRESSION_HEADER))
+        codec = get_codec(headers.get(CODEC_HEADER, MSGPACK.name))
+    except ImportError as exc:
+        # A message of a producer with other extras installed is rejected, it must not stop the consumer
+        raise ValueError(f"The message cannot be decoded here: {exc}") from exc
+
+    if compression is not None:
+        try:
+            payload = compression.decompress(payload)
+        except Exception as exc:
+            raise ValueError(f"The payload cannot be decompressed with {compression.name}: {exc!r}") from exc
+
+    data = codec.loads(payload)
+    if not isinstance(data, dict):
+        raise TypeError(f"The message has an unknown format: {type(data).__name__}")
+
+    kind = headers.get(KIND_HEADER) or message_kind(data)
+
+    if kind == KIND_SERVICE:
+        return ServiceMessage(**data)
+    if kind != KIND_MESSAGE:
+        raise TypeError(f"The message has an unknown format: {set(data.keys())}")
+
+    if headers.get(DATA_HEADER) == DATA_PACKED:
+        if not isinstance(data.get("data"), bytes if codec.binary else str):
+            raise TypeError(f"The packed `data` of the message must be {'bytes' if codec.binary else 'a string'}")
+        if defer_data:
+            if not Message.validate_fields(data.keys()):
+                raise TypeError(f"The message has an unknown format: {set(data.keys())}")
+            return DeferredMessage.create(
+                uuid=data["uuid"],
+                type_event=data["type_event"],
+                raw_data=data["data"],
+                loader=codec.loads,
+                priority=data.get("priority", 0),
+            )
+
+        data["data"] = codec.loads(data["data"])
+
+    return Message(**data)
+
+
+def encode_response(response: dict[str, Any]) -> bytes:
+    """Serializes the response to a service request, values that msgpack does not support, such as results of handlers, are sent as their repr"""
+    return ormsgpack.packb(response, default=repr)
@@ -0,0 +1,78 @@
+import argparse
+import logging
+import os
+import sys
+from typing import Optional, Sequence
+
+from taskorbit.brokers.nats.configuration import NatsConfiguration
+from taskorbit.supervisor import Supervisor, load_object
+
+
+logger = logging.getLogger(__name__)
+
+
+def _build_config(args: argparse.Namespace) -> NatsConfiguration:
+    if args.config is not None:
+        config = load_object(args.config)
+        if isinstance(config, dict):
+            config = NatsConfiguration(**config)
+        elif not isinstance(config, NatsConfiguration):
+            raise TypeError(f"The config must be a dict or an instance of NatsConfiguration, but received {type(config).__name__}")
+    else:
+        missing = [name for name in ("url", "stream", "subject", "durable") if getattr(args, name) is None]
+        if missing:
+            raise SystemExit(f"taskorbit worker: error: --config or the options {', '.join('--' + name for name in missing)} are required")
+
+        config = NatsConfiguration(url=args.url, stream=args.stream, subject=args.subject, durable=args.durable)
+
+    if args.pull:
+        config.pull_mode = True
+
+    return config
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="taskorbit", description="Taskorbit command line interface")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    worker = commands.add_parser("worker", help="Run the dispatcher in several worker processes")
+    worker.add_argument("target", help="The dispatcher in the `module:attribute` format, for example `app.main:dp`")
+    worker.add_argument("-w", "--workers", type=int, default=None, help="The number of worker processes, the number of CPUs by default")
+    worker.add_argument("--config", default=None, help="NatsConfiguration or a dict with it in the `module:attribute` format")
+    worker.add_argument("--url", default=None, help="The URL of the NATS server")
+    worker.add_argument("--stream", default=None, help="The name of the NATS stream")
+    worker.add_argument("--subject", default=None, help="The name of the NATS subject")
+    worker.add_argument("--durable", default=None, help="The name of the NATS durable")
+    worker.add_argument("--pull", action="store_true", help="Use a pull consumer")
+    worker.add_argument("--restart-delay", type=float, default=1.0, help="Pause before restarting a crashed worker, in seconds")
+    worker.add_argument("--shutdown-timeout", type=float, default=30.0, help="How long to wait for the workers to stop, in seconds")
+    worker.add_argument(
+        "--drain-timeout", type=float, default=None,
+        help="How long running tasks may finish after SIGINT/SIGTERM, in seconds, 80%% of --shutdown-timeout by default",
+    )
+    worker.add_argument("--log-level", default="INFO", help="The logging level")
+
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = _parser().parse_args(argv)
+    logging.basicConfig(level=args.log_level)
+
+    # Like other application runners, allow importing the target from the current directory
+    sys.path.insert(0, os.getcwd())
+
+    if args.command == "worker":
+        Supervisor(
+            target=args.target,
+            config=_build_config(args),
+            workers=args.workers,
+            restart_delay=args.restart_delay,
+            shutdown_timeout=args.shutdown_timeout,
+            drain_timeout=args.drain_timeout,
+            log_level=args.log_level,
+        ).run()
+
+
+if __name__ == "__main__":
+    main()
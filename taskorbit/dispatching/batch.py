@@ -0,0 +1,162 @@
+import asyncio
+import logging
+from typing import Any, Callable, Optional
+
+from taskorbit.dispatching.handler import BaseHandler
+from taskorbit.models import Message
+
+
+logger = logging.getLogger(__name__)
+
+
+class Batch:
+    """
+    The messages collected for one call of the batch handler.
+
+    Attributes:
+        messages (list[Message]): The messages in the order of arrival.
+        futures (list[asyncio.Future]): The results of the messages, awaited by their tasks.
+        kwargs (dict[str, Any]): The injected arguments of the handler, taken from the first message.
+        task (Optional[asyncio.Task]): The call of the handler, None until the batch is flushed.
+    """
+    __slots__ = ("messages", "futures", "kwargs", "task")
+
+    def __init__(self, kwargs: dict[str, Any]) -> None:
+        self.messages: list[Message] = []
+        self.futures: list[asyncio.Future] = []
+        self.kwargs = kwargs
+        self.task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def discard_cancelled(self) -> None:
+        """Drops the messages whose tasks have been cancelled while the batch was collected"""
+        if any(future.cancelled() for future in self.futures):
+            kept = [(metadata, future) for metadata, future in zip(self.messages, self.futures) if not future.cancelled()]
+            self.messages = [metadata for metadata, _ in kept]
+            self.futures = [future for _, future in kept]
+
+    def cancel_if_abandoned(self, _: asyncio.Future) -> None:
+        """Cancels the call of the handler once the tasks of all messages have been cancelled, for example by `Dispatcher.drain`"""
+        if self.task is not None and all(future.cancelled() for future in self.futures):
+            self.task.cancel()
+
+
+class BatchHandler(BaseHandler):
+    """
+    A handler that receives a list of messages. Every message still runs as a task of its own in the pool, it waits until
+    `max_size` messages are collected or `max_wait` seconds have passed since the first one, then the handler is called once
+    with the whole batch and every task gets its own result. The pool must have room for `max_size` tasks for full batches.
+
+    The handler takes `messages: list[Message]` and the keys of the stream data of the first message, and returns:
+
+        None - every message succeeds;
+        a list or a tuple - the results of the messages in the order of `messages`;
+        a dict - the results by uuid, None for the missing ones.
+
+    A result that is an exception fails only its message, the exception raised by the handler fails the whole batch.
+
+    Args:
+        handler (Callable): The coroutine function of the batch.
+        max_size (int): The maximum number of messages in a batch.
+        max_wait (float): The maximum time the first message of a batch waits for the others, in seconds.
+    """
+    def __init__(self, handler: Callable, max_size: int, max_wait: float) -> None:
+        if max_size < 1:
+            raise ValueError(f"The `max_size` must be a positive number, but received {max_size}")
+        if max_wait < 0:
+            raise ValueError(f"The `max_wait` cannot be negative, but received {max_wait}")
+
+        super().__init__()
+        self.name = handler.__name__
+        self.handle = handler
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._batch: Optional[Batch] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: set[asyncio.Task] = set()
+
+    async def handle(self, *args, **kwargs) -> None:
+        raise NotImplementedError
+
+    async def submit(self, metadata: Message, kwargs: dict[str, Any]) -> Any:
+        """
+        Adds the message to the current batch and waits for its result.
+
+        Args:
+            metadata (Message): Data of the message to be processed.
+            kwargs (dict[str, Any]): The injected arguments of the handler for this message, those of the first message are used.
+
+        :return: The result of the message, see `BatchHandler`
+        :raises Exception: The exception of the message or of the whole batch
+        """
+        loop = asyncio.get_running_loop()
+        batch = self._batch
+        if batch is None:
+            batch = self._batch = Batch(kwargs)
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        future = loop.create_future()
+        future.add_done_callback(batch.cancel_if_abandoned)
+        batch.messages.append(metadata)
+        batch.futures.append(future)
+        if len(batch) >= self.max_size:
+            self._flush()
+
+        return await future
+
+    def _flush(self) -> None:
+        """Calls the handler with the current batch, on `max_size` or when `max_wait` expires"""
+        batch, self._batch = self._batch, None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if batch is None:
+            return
+
+        batch.discard_cancelled()
+        if not batch:
+            return
+
+        batch.task = asyncio.create_task(self._run(batch))
+        self._running.add(batch.task)
+        batch.task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: Batch) -> None:
+        kwargs = {name: value for name, value in batch.kwargs.items() if name != "metadata"}
+        kwargs["messages"] = batch.messages
+        logger.debug(f"{self}: running a batch of {len(batch)} messages")
+        try:
+            results = await self._invoke(**kwargs)
+        except asyncio.CancelledError:
+            for future in batch.futures:
+                future.cancel()
+            raise
+        except Exception as exc:
+            logger.error(f"{self}: the batch of {len(batch)} messages has failed: {exc!r}")
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        if results is None:
+            results = [None] * len(batch)
+        elif isinstance(results, dict):
+            results = [results.get(metadata.uuid) for metadata in batch.messages]
+        elif not isinstance(results, (list, tuple)) or len(results) != len(batch):
+            exc = TypeError(f"The batch handler must return None, a dict by uuid or a list of {len(batch)} results")
+            results = [exc] * len(batch)
+
+        failed = 0
+        for future, result in zip(batch.futures, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                failed += 1
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+        if failed:
+            logger.warning(f"{self}: {failed} of {len(batch)} messages of the batch have failed")
@@ -0,0 +1,89 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from ormsgpack import ormsgpack
+
+from taskorbit.models import Message
+
+
+logger = logging.getLogger(__name__)
+
+MISS = object()  # returned by `ResultCache.get` when there is no result, results may be None
+
+
+def payload_key(metadata: Message) -> Optional[bytes]:
+    """
+    Returns a stable hash of `type_event` and `data`: equal payloads give equal keys regardless of the order of dict keys
+    and across processes.
+
+    :return: The 16-byte digest, None if the data cannot be serialized, for example it has non-string keys, and the message cannot be cached
+    """
+    try:
+        packed = ormsgpack.packb((metadata.type_event, metadata.data), option=ormsgpack.OPT_SORT_KEYS)
+    except TypeError:
+        return None
+
+    return hashlib.blake2b(packed, digest_size=16).digest()
+
+
+class ResultCache:
+    """
+    Memoizes the results of a deterministic handler by the hash of the payload, see `payload_key`. A hit returns the stored
+    result without running the handler and its timers. Only successful results are stored.
+
+    Args:
+        maxsize (int): The maximum number of stored results, the least recently used ones are evicted first.
+        ttl (Optional[float]): How long a result is stored, in seconds, forever if None.
+
+    Attributes:
+        hits (int): The number of messages served from the cache.
+        misses (int): The number of messages that have run the handler.
+    """
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None) -> None:
+        if maxsize < 1:
+            raise ValueError(f"The `maxsize` must be a positive number, but received {maxsize}")
+        if ttl is not None and ttl <= 0:
+            raise ValueError(f"The `ttl` must be a positive number, but received {ttl}")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._results: OrderedDict[bytes, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def __repr__(self) -> str:
+        return f"<ResultCache size={len(self)} hits={self.hits} misses={self.misses}>"
+
+    def get(self, key: bytes, default: Any = None) -> Any:
+        """Returns the stored result and counts a hit or a miss"""
+        item = self._results.get(key)
+        if item is not None:
+            expires, result = item
+            if expires > time.monotonic():
+                self._results.move_to_end(key)
+                self.hits += 1
+                return result
+            del self._results[key]
+
+        self.misses += 1
+        return default
+
+    def set(self, key: bytes, result: Any) -> None:
+        expires = float("inf") if self.ttl is None else time.monotonic() + self.ttl
+        self._results[key] = (expires, result)
+        self._results.move_to_end(key)
+        if len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def clear(self) -> None:
+        self._results.clear()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self), "hits": self.hits, "misses": self.misses}
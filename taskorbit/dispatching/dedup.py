@@ -0,0 +1,108 @@
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+
+class BaseDeduplicator(ABC):
+    """
+    Remembers the uuids of messages that are running or have recently completed, so the dispatcher drops redelivered
+    duplicates instead of running them again, see `Dispatcher(dedup=...)`.
+
+    A uuid is claimed before the message is scheduled, completed when its task is done and released if the message
+    is rejected or its task has failed, so that its redelivery is accepted. Only duplicates of completed messages are
+    dropped and acknowledged, duplicates of running ones are rejected, so the backend delivers them again until the
+    original settles, see `completed`.
+    """
+    @abstractmethod
+    async def claim(self, uuid: str) -> bool:
+        """
+        Marks the uuid as running.
+
+        :return: False if the uuid is running or has completed recently, the message is a duplicate
+        """
+        ...
+
+    def completed(self, uuid: str) -> bool:
+        """
+        Whether the uuid whose claim has failed belongs to a completed message rather than to a running one.
+        False by default, so the duplicates are redelivered until the claim expires or is released.
+        """
+        return False
+
+    @abstractmethod
+    def complete(self, uuid: str) -> None:
+        """Marks the uuid as completed, it is remembered for the TTL. Called from a done-callback, so it must not block"""
+        ...
+
+    @abstractmethod
+    def release(self, uuid: str) -> None:
+        """Forgets the uuid, the next delivery of the message will run"""
+        ...
+
+
+class MemoryDeduplicator(BaseDeduplicator):
+    """
+    A bounded LRU set of uuids with a TTL. Running uuids never expire, completed ones expire `ttl` seconds after completion.
+    When `maxsize` is reached, the least recently used uuids are forgotten first, so it should be well above the pool size.
+
+    Args:
+        maxsize (int): The maximum number of remembered uuids.
+        ttl (float): How long completed uuids are remembered, in seconds.
+    """
+    def __init__(self, maxsize: int = 100_000, ttl: float = 300.0) -> None:
+        if maxsize < 1:
+            raise ValueError(f"The `maxsize` must be a positive number, but received {maxsize}")
+        if ttl <= 0:
+            raise ValueError(f"The `ttl` must be a positive number, but received {ttl}")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._expires: OrderedDict[str, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def __contains__(self, uuid: str) -> bool:
+        expires = self._expires.get(uuid)
+        return expires is not None and expires > time.monotonic()
+
+    def _purge(self, now: float) -> None:
+        expires = self._expires
+        while expires:
+            uuid, deadline = next(iter(expires.items()))
+            if deadline > now and len(expires) < self.maxsize:
+                return
+            del expires[uuid]
+
+    async def claim(self, uuid: str) -> bool:
+        return self.claim_nowait(uuid)
+
+    def claim_nowait(self, uuid: str) -> bool:
+        """The synchronous `claim`"""
+        now = time.monotonic()
+        expires = self._expires.get(uuid)
+        if expires is not None and expires > now:
+            return False
+
+        self._purge(now)
+        self._expires[uuid] = math.inf
+        self._expires.move_to_end(uuid)
+        return True
+
+    def completed(self, uuid: str) -> bool:
+        expires = self._expires.get(uuid)
+        return expires is not None and time.monotonic() < expires < math.inf
+
+    def complete(self, uuid: str) -> None:
+        self._expires[uuid] = time.monotonic() + self.ttl
+        self._expires.move_to_end(uuid)
+        if len(self._expires) > self.maxsize:
+            self._expires.popitem(last=False)
+
+    def release(self, uuid: str) -> None:
+        self._expires.pop(uuid, None)
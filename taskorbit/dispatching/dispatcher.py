@@ -2,16 +2,28 @@ import _asyncio
 import abc
 import asyncio
 import logging
-from typing import Type, Any, Callable
+from typing import Type, Any, Awaitable, Callable, Optional
 from functools import partial
+from time import perf_counter
 
+from taskorbit.dispatching.batch import BatchHandler
+from taskorbit.dispatching.cache import MISS, payload_key
+from taskorbit.dispatching.dedup import BaseDeduplicator, MemoryDeduplicator
 from taskorbit.dispatching.handler import HandlerType
+from taskorbit.dispatching.limiter import ConcurrencyLimiter
 from taskorbit.dispatching.pool import Pool
-from taskorbit.dispatching.router import Router, find_handler
+from taskorbit.dispatching.results import ResultStore
+from taskorbit.dispatching.router import Router
+from taskorbit.dispatching.injection import get_injection
+from taskorbit.dispatching.routing import RoutingIndex, Route, walk_routes
+from taskorbit.dispatching.scheduler import FairScheduler, Lane, DEFAULT_QUOTA, UNLIMITED_POOL_PREFETCH
 from taskorbit.enums import Commands, TaskStatus
+from taskorbit.filter import FilterContext
+from taskorbit.metrics import Metrics, Sample, handler_label, render_prometheus
 from taskorbit.middlewares.manager import MiddlewareManager
 from taskorbit.models import ServiceMessage, Metadata, Message
-from taskorbit.utils import get_list_parameters
+from taskorbit.timer import TimerWheel
+from taskorbit.utils import OverlayDict
 
 logger = logging.getLogger(__name__)
 
@@ -31,20 +43,158 @@ class Dispatcher(Router):
 
     Args:
         max_pool_size (int): The maximum number of tasks that can be in the queue at the same time.
+        timer_resolution (float): The tick of the timer wheel shared by the execution and close timeouts of the handlers, in seconds.
+        single_task (bool): Run each message as exactly one task: handlers are awaited in the task of the message instead of a task
+            of their own, and timeouts and the CLOSING command act on that task directly.
+        prefetch (Optional[int]): The number of messages of each priority that may wait for a slot in front of the pool. Free slots
+            are given to the highest priority first, and fairly across the `concurrency`/`weight` quotas of handlers and routers,
+            see `taskorbit.dispatching.scheduler.FairScheduler`. If None, no messages wait unless quotas are declared, then
+            the pool size, or `UNLIMITED_POOL_PREFETCH` for an unlimited pool, so that messages of saturated lanes wait their turn.
+        metrics (bool): Record per-stage latency histograms and counters, see `taskorbit.metrics.Metrics` and `stats`.
+        dedup (bool | BaseDeduplicator): Drop messages whose uuid is running or has recently completed, True for
+            a `MemoryDeduplicator` with the default size and TTL, see `taskorbit.dispatching.dedup`.
+        results (bool | ResultStore): Keep the start time, the elapsed time and the result or exception of tasks for `GET_STATUS`,
+            True for a `ResultStore` with the default size, see `service`.
+        limiter (Optional[ConcurrencyLimiter]): Adjust the pool size at runtime within the bounds of the limiter from the latency of tasks,
+            `max_pool_size` is ignored then, see `taskorbit.dispatching.limiter`.
     """
-    def __init__(self, max_pool_size: int) -> None:
+    def __init__(
+            self,
+            max_pool_size: int,
+            timer_resolution: float = 0.1,
+            single_task: bool = False,
+            prefetch: Optional[int] = None,
+            metrics: bool = False,
+            dedup: bool | BaseDeduplicator = False,
+            results: bool | ResultStore = False,
+            limiter: Optional[ConcurrencyLimiter] = None,
+    ) -> None:
         super().__init__(name='DISPATCHER')
         self.middleware = MiddlewareManager()
         self.inner_middleware = MiddlewareManager()
-        self.pool: Pool[str, asyncio.Task] = Pool(max_pool_size)
+        self.pool: Pool[str, asyncio.Task] = Pool(max_pool_size, limiter)
         self.stream_data: dict = {}
+        self.timer_wheel = TimerWheel(timer_resolution)
+        self.single_task = single_task
+        self.scheduler = FairScheduler(self.pool, prefetch or 0, start=self._start_task)
+        self.prefetch = prefetch
+        self.metrics: Optional[Metrics] = Metrics() if metrics else None
+        if dedup is True:
+            dedup = MemoryDeduplicator()
+        self.dedup: Optional[BaseDeduplicator] = dedup if isinstance(dedup, BaseDeduplicator) else None
+        if results is True:
+            results = ResultStore()
+        self.results: Optional[ResultStore] = results if isinstance(results, ResultStore) else None
+        self.draining = False
+        self._done_callbacks: list[Callable[[str, Optional[asyncio.Task]], Any]] = []
+        self._start_callbacks: list[Callable[[str], Any]] = []
+        self._routing: Optional[RoutingIndex] = None
+        self._terminals: dict[Route, partial] = {}
+        self._labels: dict[Route, str] = {}
+        self._samples: dict[str, Sample] = {}
 
     def __setitem__(self, key, value):
         self.stream_data[key] = value
 
-    async def _service_processing(self, metadata: ServiceMessage) -> None:
+    def _tree_changed(self) -> None:
+        """Discards the routing index, it will be rebuilt from the current router tree on the next message"""
+        self._routing = None
+        self._terminals.clear()
+        self._labels.clear()
+        self.inner_middleware.reset()
+        super()._tree_changed()
+
+    @property
+    def routing(self) -> RoutingIndex:
+        """The compiled routing table of the router tree, see `taskorbit.dispatching.routing.RoutingIndex`"""
+        if self._routing is None:
+            self._routing = RoutingIndex(self)
+            if self.prefetch is None:
+                self.scheduler.set_prefetch((self.pool.max_size or UNLIMITED_POOL_PREFETCH) if self._routing.has_quotas else 0)
+            if self._routing.has_quotas:
+                # the lanes are created in advance, so `free` accounts for all of them
+                for key, quota in self._routing.lanes.items():
+                    self.scheduler.lane(key, quota)
+
+        return self._routing
+
+    @property
+    def scheduled(self) -> bool:
+        """Whether messages are admitted into the pool through the scheduler: quotas are declared or `prefetch` is set"""
+        return self.scheduler.prefetch > 0 or self.routing.has_quotas
+
+    @property
+    def full(self) -> bool:
+        """Whether the dispatcher cannot accept messages: no lane has a free slot or a free place to wait"""
+        return self.free == 0
+
+    @property
+    def free(self) -> Optional[int]:
+        """The number of messages the dispatcher can accept now, see `FairScheduler.room`, None if it is unlimited"""
+        if self.scheduled:
+            return self.scheduler.room()
+
+        return self.pool.free
+
+    async def wait_free(self) -> None:
+        """Waits until the dispatcher can accept a message"""
+        while self.full:
+            await self.pool.wait_released()
+
+    def gauges(self) -> dict[str, float]:
+        """The current occupancy of the pool, the waiting messages and the armed timers"""
+        return {
+            "pool_size": len(self.pool),
+            "pool_max_size": self.pool.max_size,
+            "waiting_messages": self.scheduler.buffered,
+            "active_timers": len(self.timer_wheel),
+        }
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Returns the gauges, the result caches of handlers and, with `Dispatcher(metrics=True)`, the per-stage histograms and counters.
+
+            {
+                "gauges": {"pool_size": 3, "pool_max_size": 10, "waiting_messages": 0, "active_timers": 6},
+                "stages": {"handler": [{"handler": "h", "type_event": "A", "count": 10, "sum": 0.5, "p50": 0.04, "p99": 0.09}]},
+                "counters": {"messages": [{"handler": "h", "type_event": "A", "value": 10}]},
+            }
+
+        :return: dict[str, Any]
+        """
+        stats: dict[str, Any] = {"gauges": self.gauges()}
+        if self.metrics is not None:
+            stats.update(self.metrics.snapshot())
+
+        caches = {handler_label(handler): handler.cache.stats for handler, _, _ in walk_routes(self) if handler.cache is not None}
+        if caches:
+            stats["caches"] = caches
+
+        return stats
+
+    def render_metrics(self) -> str:
+        """Returns the gauges and metrics in the Prometheus text format, see `taskorbit.metrics.MetricsServer`"""
+        return render_prometheus(self.gauges(), self.metrics)
+
+    def task_status(self, uuid: str) -> dict[str, Any]:
+        """
+        Returns the status of the task. With `results` it includes the start time, the elapsed time and, once the task
+        has finished, its result or exception; otherwise only RUNNING or UNKNOWN is known.
+
+            {"uuid": "...", "status": "COMPLETED", "started_at": 1700000000.0, "elapsed": 0.5, "result": 42, "exception": None}
+
+        :return: dict[str, Any]
         """
-        This is a standard service handler for working with service messages. Currently, in test mode.
+        record = self.results.get(uuid) if self.results is not None else None
+        if record is not None:
+            return record.to_dict()
+
+        status: TaskStatus = self.pool.get_status_task(uuid)
+        return {"uuid": uuid, "status": status.value, "started_at": None, "elapsed": None, "result": None, "exception": None}
+
+    async def service(self, metadata: ServiceMessage) -> dict[str, Any]:
+        """
+        Executes the service command and returns the response, the broker sends it back to requests.
 
         Command support:
 
@@ -52,19 +202,36 @@ class Dispatcher(Router):
 
             CLOSING - close a task
 
+        The command applies to `metadata.uuids` if they are given, otherwise to `metadata.uuid`.
+
         Args:
             metadata (ServiceMessage): The service message to be processed.
+
+        :return: `{"tasks": [...]}`, the statuses of the tasks after the command, see `task_status`
         """
         logger.debug(f"Getting service messages: {metadata.command}")
+        uuids = metadata.uuids if metadata.uuids is not None else (metadata.uuid,)
+        if metadata.command == Commands.CLOSING:
+            for uuid in uuids:
+                if uuid in self.pool:
+                    self.pool[uuid].cancel()
+                    logger.debug(f"The task-{uuid} was forcibly completed")
+                else:
+                    logger.warning(f"Failed to close the task-{uuid}, there is no such task in the queue")
+
+        return {"tasks": [self.task_status(uuid) for uuid in uuids]}
+
+    async def _service_processing(self, metadata: ServiceMessage) -> None:
+        """
+        This is a standard service handler for service messages received without a request, see `service`.
+
+        Args:
+            metadata (ServiceMessage): The service message to be processed.
+        """
+        response = await self.service(metadata)
         if metadata.command == Commands.GET_STATUS:
-            status: TaskStatus = self.pool.get_status_task(metadata.uuid)
-            logger.debug(f"Task-{metadata.uuid} STATUS: {status}")
-        elif metadata.command == Commands.CLOSING:
-            if metadata.uuid in self.pool:
-                self.pool[metadata.uuid].cancel()
-                logger.debug(f"The task-{metadata.uuid} was forcibly completed")
-            else:
-                logger.warning(f"Failed to close the task-{metadata.uuid}, there is no such task in the queue")
+            for task in response["tasks"]:
+                logger.debug(f"Task-{task['uuid']} STATUS: {task['status']}")
 
     def __cb_close_task(self, future: _asyncio.Task) -> None:
         """
@@ -78,31 +245,219 @@ class Dispatcher(Router):
         self.pool.pop(name)
         logger.debug(f"The task-{name} has been removed from the queue")
 
-    async def listen(self, metadata: Metadata) -> None:
+    def __cb_sample_latency(self, started: float, future: _asyncio.Task) -> None:
+        """Passes the latency of the task to the limiter before the task leaves the pool, so the waiters see the new limit"""
+        if not future.cancelled():
+            self.pool.limiter.update(perf_counter() - started, future.exception() is not None, len(self.pool))
+
+    def __cb_complete_uuid(self, future: _asyncio.Task) -> None:
+        """Remembers the uuid of the completed task, so its redeliveries are dropped, see `dedup`. A failed task is forgotten, so it can be retried"""
+        if not future.cancelled() and future.exception() is not None:
+            self.dedup.release(future.get_name())
+        else:
+            self.dedup.complete(future.get_name())
+
+    def __cb_settle(self, future: _asyncio.Task) -> None:
+        """Calls the callbacks added with `add_done_callback`"""
+        for callback in self._done_callbacks:
+            callback(future.get_name(), future)
+
+    def __cb_forget_sample(self, future: _asyncio.Task) -> None:
+        sample: Optional[Sample] = self._samples.pop(future.get_name(), None)
+        if sample is not None:
+            sample.settled = True
+            self.metrics.flush_ack(sample)
+
+    def sample(self, uuid: str) -> Optional[Sample]:
+        """
+        Returns the timings of the message with `metrics=True`, from its start until the callbacks of its task have been called.
+        Brokers label the ack of the message with its `handler` and `type_event`, the handler is set once it has been found.
+        """
+        return self._samples.get(uuid)
+
+    def add_done_callback(self, callback: Callable[[str, Optional[asyncio.Task]], Any]) -> None:
+        """
+        Adds a callback that is called when an accepted message has been processed: with the uuid and the task of the message
+        when the task is done, with the uuid and None when the message has been dropped as a duplicate of a completed one, see `dedup`.
+        Brokers use it to acknowledge messages after completion, see `taskorbit.enums.AckPolicy`.
+
+        Args:
+            callback (Callable[[str, Optional[asyncio.Task]], Any]): The callback, it must not block.
+        """
+        self._done_callbacks.append(callback)
+
+    def remove_done_callback(self, callback: Callable[[str, Optional[asyncio.Task]], Any]) -> None:
+        if callback in self._done_callbacks:
+            self._done_callbacks.remove(callback)
+
+    def add_start_callback(self, callback: Callable[[str], Any]) -> None:
+        """
+        Adds a callback that is called with the uuid of an accepted message when its task is created in the pool, at once
+        or after waiting in the scheduler. Brokers use it to acknowledge messages with `taskorbit.enums.AckPolicy.ACCEPT`.
+
+        Args:
+            callback (Callable[[str], Any]): The callback, it must not block.
+        """
+        self._start_callbacks.append(callback)
+
+    def remove_start_callback(self, callback: Callable[[str], Any]) -> None:
+        if callback in self._start_callbacks:
+            self._start_callbacks.remove(callback)
+
+    def __cb_release_lane(self, lane: Lane, _: _asyncio.Task) -> None:
+        """Frees the slot of the lane after the task has been removed from the pool, so waiting messages can take it"""
+        self.scheduler.release(lane)
+
+    async def listen(self, metadata: Metadata) -> bool:
         """
         A function that listens for messages received by the dispatcher that have passed validation
 
         Args:
             metadata (Message): Data of the message to be processed.
+
+        :return: False if the message has been rejected because it cannot start and its lane has no room to wait, see `FairScheduler`,
+            or because the dispatcher is draining, see `drain`. Duplicates of completed messages dropped by `dedup` are accepted,
+            so the broker acknowledges them, duplicates of running messages are rejected, so they are delivered again later.
         """
         if isinstance(metadata, ServiceMessage):
             _ = asyncio.create_task(self._service_processing(metadata))
         elif isinstance(metadata, Message):
-            task = asyncio.create_task(self._metadata_processing(metadata), name=metadata.uuid)
-            task.add_done_callback(self.__cb_close_task)
-            self.pool[metadata.uuid] = task
+            if self.draining:
+                logger.debug(f"The dispatcher is draining, the task-{metadata.uuid} has been rejected")
+                return False
 
-    async def _metadata_processing(self, metadata: Metadata) -> None:
+            if self.dedup is not None and not await self.dedup.claim(metadata.uuid):
+                if self.metrics is not None:
+                    self.metrics.inc("duplicates", "", metadata.type_event)
+                if not self.dedup.completed(metadata.uuid):
+                    logger.debug(f"The task-{metadata.uuid} is a duplicate of a running message and has been rejected")
+                    return False
+
+                logger.debug(f"The task-{metadata.uuid} is a duplicate and has been dropped")
+                if self.metrics is not None:
+                    self._samples[metadata.uuid] = Sample(metadata.type_event, settled=True)
+                for callback in self._done_callbacks:
+                    callback(metadata.uuid, None)
+                if self.metrics is not None:
+                    self._samples.pop(metadata.uuid, None)
+                return True
+
+            if not self.scheduled:
+                self._start_task(None, metadata)
+            elif not self.scheduler.submit(await self._get_lane(metadata), metadata):
+                if self.dedup is not None:
+                    self.dedup.release(metadata.uuid)
+                return False
+
+        return True
+
+    async def drain(self, timeout: float, cancel: bool = True) -> list[str]:
+        """
+        Stops accepting messages and lets the tasks in the pool finish within the timeout. Messages waiting in the scheduler
+        are not started, tasks still running at the deadline are cancelled unless `cancel` is False. The dedup claims
+        of the messages left are released, so their redeliveries run. Brokers call it from `BaseBroker.drain`, which also
+        stops fetching and naks the messages left.
+
+            left = await dp.drain(timeout=25)
+
+        Args:
+            timeout (float): How long to wait for the running tasks, in seconds.
+            cancel (bool): Cancel the tasks still running at the deadline. Brokers that have acknowledged the messages
+                of the running tasks keep them running, they cannot be handed back.
+
+        :return: The uuids of the messages that have not been processed: the waiting ones, then the cancelled ones
+        """
+        self.draining = True
+        left: list[str] = [metadata.uuid for metadata in self.scheduler.drain()]
+        if left:
+            logger.info(f"Draining: {len(left)} waiting messages will not be started")
+
+        running: list[asyncio.Task] = list(self.pool.values())
+        if running:
+            logger.info(f"Draining: waiting up to {timeout}s for {len(running)} running tasks")
+            _, pending = await asyncio.wait(running, timeout=timeout)
+            if pending and not cancel:
+                logger.warning(f"Draining: {len(pending)} tasks have not finished in {timeout}s and keep running")
+            elif pending:
+                logger.warning(f"Draining: {len(pending)} tasks have not finished in {timeout}s and will be cancelled")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                left.extend(task.get_name() for task in pending)
+
+        if self.dedup is not None:
+            for uuid in left:
+                self.dedup.release(uuid)
+
+        return left
+
+    async def _get_lane(self, metadata: Message) -> Lane:
+        """Finds the lane of the message by its handler, the filters see `stream_data` because outer middlewares have not run yet"""
+        if not self.routing.has_quotas:
+            return self.scheduler.lane(None, DEFAULT_QUOTA)
+
+        try:
+            route: Route = await self.routing.find(metadata=metadata, data=self.stream_data)
+        except RuntimeError:
+            return self.scheduler.lane(None, DEFAULT_QUOTA)
+
+        return self.scheduler.lane(route.lane, route.quota)
+
+    def _start_task(self, lane: Optional[Lane], metadata: Message) -> None:
+        """
+        Creates the task of the message in the pool.
+
+        Args:
+            lane (Optional[Lane]): The lane whose slot the task takes, None if there are no quotas.
+            metadata (Message): Data of the message to be processed.
+        """
+        task = asyncio.create_task(self._metadata_processing(metadata), name=metadata.uuid)
+        if self.results is not None:
+            self.results.start(metadata.uuid)
+            task.add_done_callback(self.results.finish)
+        if self.pool.limiter is not None:
+            task.add_done_callback(partial(self.__cb_sample_latency, perf_counter()))
+        task.add_done_callback(self.__cb_close_task)
+        if self.dedup is not None:
+            task.add_done_callback(self.__cb_complete_uuid)
+        if lane is not None:
+            task.add_done_callback(partial(self.__cb_release_lane, lane))
+        if self._done_callbacks:
+            task.add_done_callback(self.__cb_settle)
+        if self.metrics is not None:
+            self._samples[metadata.uuid] = Sample(metadata.type_event)
+            task.add_done_callback(self.__cb_forget_sample)
+        self.pool[metadata.uuid] = task
+        for callback in self._start_callbacks:
+            callback(metadata.uuid)
+
+    async def _metadata_processing(self, metadata: Metadata) -> Any:
         """
         The first stage of processing is passing through outer middlewares
 
         Args:
             metadata (Message): Data of the message to be processed.
         """
-        data = self.stream_data.copy()
+        data = OverlayDict(self.stream_data)
+        FilterContext.current.set(FilterContext(metadata, data))
+        if self.metrics is not None:
+            return await self._measured_processing(metadata, data)
 
         call_processing: partial = await self.middleware.middleware_processing(handler=self._message_processing, metadata=metadata)
-        await call_processing(metadata=metadata, data=data)
+        return await call_processing(metadata=metadata, data=data)
+
+    async def _measured_processing(self, metadata: Message, data: dict[str, Any]) -> Any:
+        """The first stage of processing with the timings of the message recorded, see `Dispatcher(metrics=True)`"""
+        sample = self._samples.get(metadata.uuid) or Sample(metadata.type_event)
+        Metrics.sample.set(sample)
+
+        start = perf_counter()
+        try:
+            call_processing: partial = await self.middleware.middleware_processing(handler=self._message_processing, metadata=metadata)
+            return await call_processing(metadata=metadata, data=data)
+        finally:
+            elapsed = perf_counter() - start
+            self.metrics.observe("outer_middleware", sample.handler, sample.type_event, elapsed - sample.lookup - sample.inner - sample.execution)
 
     async def _message_processing(self, metadata: Message, data: dict[str, Any]) -> Any:
         """
@@ -112,37 +467,116 @@ class Dispatcher(Router):
             metadata (Message): Data of the message to be processed.
             data (dict[str, Any]): Message flow data mutated through outer middlewares
         """
-        handler: Type[HandlerType] = await find_handler(
-            handlers=self.handlers,
-            router=self,
-            metadata=metadata,
-            data=data
-        )
-
-        async def _handler_processing(metadata: Message, data: dict[str, Any]) -> Any:
-            """
-            Running the Handler
-
-            Args:
-                metadata (Message): Data of the message to be processed.
-                data (dict[str, Any]): Message flow data mutated through outer middlewares
-            """
-            nonlocal handler
-            if isinstance(handler, abc.ABCMeta):
-                handler = handler(**get_list_parameters(handler.__init__, metadata=metadata, data=data))
-
-            handler.uuid = metadata.uuid
-            fields_cls: dict = get_list_parameters(handler.__call__, metadata=metadata, data=data)
-            fields_handle: dict = get_list_parameters(handler.handle, metadata=metadata, data=data, is_handler=True)
-            fields_execution_callback: dict = get_list_parameters(handler.on_execution_cb, metadata=metadata, data=data, is_handler=True)
-            fields_close_callback: dict = get_list_parameters(handler.on_close_cb, metadata=metadata, data=data, is_handler=True)
-
-            return await handler(**{
-                    **fields_cls, **fields_handle,
-                    'fields_execution_callback': fields_execution_callback,
-                    'fields_close_callback': fields_close_callback
-            })
-
-        call_processing: partial | Callable = await self.inner_middleware.middleware_processing(handler=_handler_processing, metadata=metadata)
+        sample: Optional[Sample] = Metrics.sample.get() if self.metrics is not None else None
+        if sample is not None:
+            start = perf_counter()
+            route: Route = await self.routing.find(metadata=metadata, data=data)
+            sample.lookup = perf_counter() - start
+            sample.handler = self._get_label(route)
+            self.metrics.observe("lookup", sample.handler, sample.type_event, sample.lookup)
+            self.metrics.flush_ack(sample)
+        else:
+            route: Route = await self.routing.find(metadata=metadata, data=data)
 
-        return await call_processing(metadata=metadata, data=data)
+        terminal = self._terminals.get(route)
+        if terminal is None:
+            terminal = self._terminals[route] = partial(self._handler_processing, route)
+
+        call_processing: partial | Callable = await self.inner_middleware.middleware_processing(handler=terminal, metadata=metadata)
+        if sample is None:
+            return await call_processing(metadata=metadata, data=data)
+
+        start = perf_counter()
+        try:
+            return await call_processing(metadata=metadata, data=data)
+        finally:
+            sample.inner = perf_counter() - start - sample.execution
+            self.metrics.observe("inner_middleware", sample.handler, sample.type_event, sample.inner)
+
+    def _get_label(self, route: Route) -> str:
+        label = self._labels.get(route)
+        if label is None:
+            label = self._labels[route] = handler_label(route.handler)
+
+        return label
+
+    async def _handler_processing(self, route: Route, metadata: Message, data: dict[str, Any]) -> Any:
+        """
+        Running the Handler
+
+        Args:
+            route (Route): The route of the handler found for the message.
+            metadata (Message): Data of the message to be processed.
+            data (dict[str, Any]): Message flow data mutated through outer middlewares
+        """
+        handler: Type[HandlerType] = route.handler
+        if isinstance(handler, BatchHandler):
+            return await self._execute(handler.submit(metadata, route.plan.handle(metadata, data)))
+        if handler.cache is not None:
+            return await self._cached_processing(route, metadata, data)
+
+        return await self._run_handler(route, metadata, data)
+
+    async def _cached_processing(self, route: Route, metadata: Message, data: dict[str, Any]) -> Any:
+        """Serves the result from the cache of the handler or runs the handler and stores its result, see `ResultCache`"""
+        cache = route.handler.cache
+        key: Optional[bytes] = payload_key(metadata)
+        if key is None:
+            return await self._run_handler(route, metadata, data)
+
+        result = cache.get(key, MISS)
+        if self.metrics is not None:
+            self.metrics.inc("cache_misses" if result is MISS else "cache_hits", self._get_label(route), metadata.type_event)
+        if result is not MISS:
+            return result
+
+        result = await self._run_handler(route, metadata, data)
+        cache.set(key, result)
+        return result
+
+    async def _run_handler(self, route: Route, metadata: Message, data: dict[str, Any]) -> Any:
+        """
+        Instantiates the handler and runs it with its timers
+
+        Args:
+            route (Route): The route of the handler found for the message.
+            metadata (Message): Data of the message to be processed.
+            data (dict[str, Any]): Message flow data mutated through outer middlewares
+        """
+        handler: Type[HandlerType] = route.handler
+        if isinstance(handler, abc.ABCMeta):
+            handler = handler(**route.plan.init(metadata, data))
+
+        handler.uuid = metadata.uuid
+        handler._timer_manager.wheel = self.timer_wheel
+        handler.single_task = self.single_task
+        fields_cls: dict = route.plan.call(metadata, data)
+        fields_handle: dict = route.plan.handle(metadata, data)
+        fields_execution_callback: dict = get_injection(handler.on_execution_cb, is_handler=True)(metadata, data)
+        fields_close_callback: dict = get_injection(handler.on_close_cb, is_handler=True)(metadata, data)
+
+        fields: dict = {
+            **fields_cls, **fields_handle,
+            'fields_execution_callback': fields_execution_callback,
+            'fields_close_callback': fields_close_callback
+        }
+        return await self._execute(handler(**fields))
+
+    async def _execute(self, execution: Awaitable[Any]) -> Any:
+        """Awaits the handler, recording its duration, the message and the error with `Dispatcher(metrics=True)`"""
+        sample: Optional[Sample] = Metrics.sample.get() if self.metrics is not None else None
+        if sample is None:
+            return await execution
+
+        start = perf_counter()
+        try:
+            result = await execution
+        except BaseException:
+            self.metrics.inc("errors", sample.handler, sample.type_event)
+            raise
+        finally:
+            sample.execution = perf_counter() - start
+            self.metrics.observe("handler", sample.handler, sample.type_event, sample.execution)
+            self.metrics.inc("messages", sample.handler, sample.type_event)
+
+        return result
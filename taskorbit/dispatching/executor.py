@@ -0,0 +1,96 @@
+import asyncio
+import inspect
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+from typing import Any, Callable, Literal, Optional
+
+
+logger = logging.getLogger(__name__)
+
+ExecutorType = Literal["thread", "process"]
+EXECUTOR_TYPES: tuple[str, ...] = ("thread", "process")
+
+
+def _call(func: Callable, kwargs: dict[str, Any]) -> Any:
+    """Calls the handler in the worker, coroutine functions are run on a loop of their own"""
+    result = func(**kwargs)
+    if inspect.isawaitable(result):
+        result = asyncio.run(result)
+
+    return result
+
+
+class Offload:
+    """
+    Runs handlers off the event loop, in a thread pool or in a process pool, so CPU-bound and synchronous code does not
+    block the other tasks of the pool. Results and exceptions are returned to the task of the message.
+
+    With "process" the handler, its arguments and its result are pickled: the handler must be importable (a module-level
+    function or class), and the worker processes are spawned, so a script must start the dispatcher under `if __name__ == "__main__":`.
+
+    A close timeout cancels the task of the message, but the work that has already started in a thread or a process
+    cannot be interrupted and runs to its end in the background.
+
+    Args:
+        kind (ExecutorType): "thread" or "process".
+        max_workers (Optional[int]): The size of the pool, the default of `concurrent.futures` if None.
+    """
+    def __init__(self, kind: ExecutorType, max_workers: Optional[int] = None) -> None:
+        if kind not in EXECUTOR_TYPES:
+            raise ValueError(f"The executor must be one of {', '.join(EXECUTOR_TYPES)}, but received {kind!r}")
+        if max_workers is not None and max_workers < 1:
+            raise ValueError(f"The `max_workers` must be a positive number, but received {max_workers}")
+
+        self.kind = kind
+        self.max_workers = max_workers
+        self._executor: Optional[Executor] = None
+
+    def __repr__(self) -> str:
+        return f"<Offload:{self.kind} max_workers={self.max_workers}>"
+
+    @property
+    def executor(self) -> Executor:
+        """The pool, created on the first use"""
+        if self._executor is None:
+            if self.kind == "thread":
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="taskorbit")
+            else:
+                self._executor = ProcessPoolExecutor(self.max_workers, mp_context=get_context("spawn"))
+
+        return self._executor
+
+    async def run(self, func: Callable, kwargs: dict[str, Any]) -> Any:
+        """
+        Runs the handler in the pool and waits for its result.
+
+        Args:
+            func (Callable): The handler, a function or a coroutine function.
+            kwargs (dict[str, Any]): The injected arguments of the handler.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(_call, func, kwargs))
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+_offloads: dict[tuple[str, Optional[int]], Offload] = {}
+
+
+def get_offload(kind: ExecutorType, max_workers: Optional[int] = None) -> Offload:
+    """Returns the pool of the kind and size, handlers declared with the same `executor` and `executor_workers` share it"""
+    offload = _offloads.get((kind, max_workers))
+    if offload is None:
+        offload = _offloads[(kind, max_workers)] = Offload(kind, max_workers)
+
+    return offload
+
+
+def shutdown_offloads(wait: bool = True) -> None:
+    """Shuts down all pools created by `get_offload`"""
+    for offload in _offloads.values():
+        offload.shutdown(wait=wait)
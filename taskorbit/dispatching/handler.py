@@ -2,9 +2,12 @@ import asyncio
 import inspect
 import logging
 from abc import ABC, abstractmethod
+from functools import partial
 from types import NoneType
 from typing import Callable, Awaitable, Optional, Union, Any
 
+from taskorbit.dispatching.cache import ResultCache
+from taskorbit.dispatching.executor import Offload
 from taskorbit.timer import TimerManager
 
 logger = logging.getLogger(__name__)
@@ -23,12 +26,21 @@ class BaseHandler(ABC):
         close_timeout (int): Timeout, after the time expires, the task is terminated by the on_close_cb or standard with logging, after the function is
             executed, the task is terminated
         on_close_cb (Callable[[...], Awaitable[None]]): A callback that runs when you want to interrupt a task when a timeout expires
+        single_task (bool): If True, `handle` runs in the task of the message instead of a task of its own, timeouts cancel the task
+            of the message directly. Set by the dispatcher, see `Dispatcher(single_task=...)`.
+        executor (Optional[Offload]): Runs `handle` in a thread or process pool, then it may be a regular function.
+            Set with `include_handler(executor=...)` or `include_class_handler(executor=...)`, see `Offload`.
+        cache (Optional[ResultCache]): Memoizes the results of `handle` by the payload, set with `include_handler(cache=...)`.
     """
+    executor: Optional[Offload] = None
+    cache: Optional[ResultCache] = None
+
     def __init__(self) -> None:
         self.name = "unknown"
 
         self.__task = None
         self._timer_manager = TimerManager()
+        self.single_task = False
 
         self.uuid: Optional[str] = None
 
@@ -49,6 +61,19 @@ class BaseHandler(ABC):
     def __str__(self) -> str:
         return f"<Handler:{self.name}>"
 
+    def __getstate__(self) -> dict[str, Any]:
+        """The runtime state is not pickled, the handler is pickled when `handle` runs in a process pool"""
+        state = self.__dict__.copy()
+        state["_BaseHandler__task"] = None
+        state["_timer_manager"] = None
+        state.pop("executor", None)
+        state.pop("cache", None)
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._timer_manager = TimerManager()
+
     def __repr__(self) -> str:
         return self.__str__()
 
@@ -59,14 +84,15 @@ class BaseHandler(ABC):
         else:
             logger.debug(f"Please wait, the task-{self.uuid} is still in progress...")
 
-    async def _close(self, **kwargs) -> None:
+    async def _close(self, task: Optional[asyncio.Task] = None, /, **kwargs) -> None:
         """The process of executing a callback for a program timeout to close at timeout"""
         if self.on_close_cb is not None:
             await self.on_close_cb(**kwargs)
 
         logger.debug("The timeout has expired and the task is being closed...")
-        if self.__task is not None:
-            self.__task.cancel()
+        task = task or self.__task
+        if task is not None:
+            task.cancel()
         else:
             logger.warning("Closing via timeout was incorrect. The task does not exist!")
             self.cancel(...)
@@ -88,7 +114,14 @@ class BaseHandler(ABC):
         """
         ...
 
-    async def __call__(self, fields_execution_callback: dict[str, Any], fields_close_callback: dict[str, Any], **kwargs) -> None:
+    def _invoke(self, **kwargs) -> Awaitable[Any]:
+        """Calls `handle` on the loop or in the pool of the `executor`"""
+        if self.executor is None:
+            return self.handle(**kwargs)
+
+        return self.executor.run(self.handle, kwargs)
+
+    async def __call__(self, fields_execution_callback: dict[str, Any], fields_close_callback: dict[str, Any], **kwargs) -> Any:
         """
         Handler execution process
 
@@ -97,12 +130,35 @@ class BaseHandler(ABC):
             fields_close_callback (dict[str, Any]): kwargs for callback close
             **kwargs: The arguments of the handler.
         """
-        self.__task = asyncio.create_task(self.handle(**kwargs))
+        if self.single_task:
+            return await self._call_in_current_task(fields_execution_callback, fields_close_callback, **kwargs)
+
+        self.__task = asyncio.create_task(self._invoke(**kwargs))
         self.__task.add_done_callback(self.cancel)
 
         await self._timer_manager.start_timer(self.execution_timeout, self._execution, **fields_execution_callback)
         await self._timer_manager.start_timer(self.close_timeout, self._close, **fields_close_callback)
-        await self.__task
+        return await self.__task
+
+    async def _call_in_current_task(self, fields_execution_callback: dict[str, Any], fields_close_callback: dict[str, Any], **kwargs) -> Any:
+        """
+        Handler execution process without a task of its own. The timers are bound to the task of the message and cancelled
+        when `handle` returns, so concurrent messages of the same handler instance do not affect each other.
+
+        Args:
+            fields_execution_callback (dict[str, Any]): kwargs for callback waiting
+            fields_close_callback (dict[str, Any]): kwargs for callback close
+            **kwargs: The arguments of the handler.
+        """
+        task = self.__task = asyncio.current_task()
+
+        execution_timer = await self._timer_manager.start_timer(self.execution_timeout, self._execution, **fields_execution_callback)
+        close_timer = await self._timer_manager.start_timer(self.close_timeout, partial(self._close, task), **fields_close_callback)
+        try:
+            return await self._invoke(**kwargs)
+        finally:
+            self._timer_manager.cancel_timer(execution_timer)
+            self._timer_manager.cancel_timer(close_timer)
 
 
 class Handler(BaseHandler):
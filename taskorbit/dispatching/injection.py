@@ -0,0 +1,92 @@
+import inspect
+import logging
+from functools import lru_cache
+from typing import Callable, Any, Optional, Mapping, Type
+
+from taskorbit.models import Message
+
+
+logger = logging.getLogger(__name__)
+
+
+class Injection:
+    """
+    A precomputed plan of the arguments that a callable accepts. Replaces `taskorbit.utils.get_list_parameters` on the hot path,
+    the signature is inspected once instead of on every message.
+
+    Args:
+        func (Callable): The callable whose arguments are injected.
+        is_handler (bool): If True, the values are taken from the keys of the stream data, otherwise only `metadata` and `data` are passed.
+        bound (bool): If True, the first parameter (self) is skipped, used for functions taken from the class.
+    """
+    __slots__ = ("names", "is_handler")
+
+    def __init__(self, func: Optional[Callable], is_handler: bool = False, bound: bool = False) -> None:
+        self.is_handler = is_handler
+        if func is None:
+            self.names: tuple[str, ...] = ()
+            return
+
+        names = tuple(inspect.signature(func).parameters)
+        self.names = names[1:] if bound else names
+
+    def __call__(self, metadata: Message, data: Mapping[str, Any]) -> dict[str, Any]:
+        """
+        Builds the keyword arguments for the callable.
+
+        Args:
+            metadata (Message): Data of the message to be processed.
+            data (Mapping[str, Any]): Message flow data.
+        """
+        kwargs = {}
+        if self.is_handler:
+            for name in self.names:
+                if name in data:
+                    kwargs[name] = data[name]
+                elif name == "metadata":
+                    kwargs[name] = metadata
+        else:
+            for name in self.names:
+                if name == "metadata":
+                    kwargs[name] = metadata
+                elif name == "data":
+                    kwargs[name] = data
+
+        return kwargs
+
+
+@lru_cache(maxsize=1024)
+def _get_injection(func: Optional[Callable], is_handler: bool, bound: bool) -> Injection:
+    return Injection(func, is_handler=is_handler, bound=bound)
+
+
+def get_injection(func: Optional[Callable], is_handler: bool = False) -> Injection:
+    """
+    Returns the cached injection plan of the callable. Bound methods share the plan of their function.
+
+    Args:
+        func (Optional[Callable]): The callable, for example a callback of the handler.
+        is_handler (bool): See `Injection`.
+    """
+    underlying = getattr(func, "__func__", func)
+    return _get_injection(underlying, is_handler, underlying is not func)
+
+
+class HandlerPlan:
+    """
+    The injection plan of the handler, computed once when the routing index is built.
+
+    Args:
+        handler (Type[HandlerType]): A handler class or an instance of `Handler` made from a function.
+    """
+    __slots__ = ("init", "call", "handle")
+
+    def __init__(self, handler: Type[Any]) -> None:
+        if inspect.isclass(handler):
+            self.init: Optional[Injection] = _get_injection(handler.__init__, False, True)
+            self.call: Injection = _get_injection(handler.__call__, False, True)
+            self.handle: Injection = _get_injection(handler.handle, True, True)
+        else:
+            self.init = None
+            self.call = get_injection(handler.__call__)
+            self.handle = get_injection(handler.handle, is_handler=True)
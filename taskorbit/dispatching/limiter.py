@@ -0,0 +1,182 @@
+import logging
+import math
+from abc import ABC, abstractmethod
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyLimiter(ABC):
+    """
+    Adjusts the size of the dispatcher pool at runtime from the latency of finished tasks, see `Dispatcher(limiter=...)`.
+    `Pool.max_size` returns the current `limit`, so the brokers fetch and accept only as many messages as it allows.
+
+    Args:
+        min_limit (int): The lowest limit.
+        max_limit (int): The highest limit.
+        initial (Optional[int]): The limit before the first sample, `min_limit` if None.
+    """
+    def __init__(self, min_limit: int, max_limit: int, initial: Optional[int] = None) -> None:
+        self._estimate = 0.0
+        self.set_bounds(min_limit, max_limit)
+        self._estimate = float(min_limit if initial is None else min(max(initial, min_limit), max_limit))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(limit={self.limit}, min_limit={self.min_limit}, max_limit={self.max_limit})"
+
+    @property
+    def limit(self) -> int:
+        """The current maximum number of tasks in the pool"""
+        return int(self._estimate)
+
+    def set_bounds(self, min_limit: int, max_limit: int) -> None:
+        """Changes the bounds, the current limit is clamped to them. The supervisor splits them across the workers"""
+        if min_limit < 1:
+            raise ValueError(f"The `min_limit` must be a positive number, but received {min_limit}")
+        if max_limit < min_limit:
+            raise ValueError(f"The `max_limit` cannot be less than `min_limit`, but received {max_limit} < {min_limit}")
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self._estimate = min(max(self._estimate, float(min_limit)), float(max_limit))
+
+    def _set(self, estimate: float) -> None:
+        previous = self.limit
+        self._estimate = min(max(estimate, float(self.min_limit)), float(self.max_limit))
+        if self.limit != previous:
+            logger.debug(f"{self}: the limit has changed from {previous}")
+
+    @abstractmethod
+    def update(self, latency: float, failed: bool, inflight: int) -> None:
+        """
+        Takes the sample of a finished task.
+
+        Args:
+            latency (float): How long the task has run, in seconds.
+            failed (bool): Whether the task has raised an exception, cancelled tasks are not sampled.
+            inflight (int): The number of tasks in the pool when the task finished, including it.
+        """
+
+
+class AIMDLimiter(ConcurrencyLimiter):
+    """
+    Additive increase, multiplicative decrease. The limit grows by `increase` per `limit` successful tasks while the pool is
+    at least half used, and is multiplied by `backoff` when a task fails or runs longer than `latency_threshold`.
+    A drop lowers the limit at most once per `limit` samples, so a burst of failures of concurrent tasks counts as one.
+
+        dp = Dispatcher(max_pool_size=0, limiter=AIMDLimiter(min_limit=4, max_limit=200, latency_threshold=0.5))
+
+    Args:
+        min_limit (int): The lowest limit.
+        max_limit (int): The highest limit.
+        initial (Optional[int]): The limit before the first sample, `min_limit` if None.
+        latency_threshold (Optional[float]): The latency that counts as overload, in seconds, only failures count if None.
+        backoff (float): The factor of the limit on overload, between 0 and 1.
+        increase (float): The growth of the limit per `limit` successful tasks.
+    """
+    def __init__(
+            self,
+            min_limit: int = 1,
+            max_limit: int = 100,
+            initial: Optional[int] = None,
+            latency_threshold: Optional[float] = None,
+            backoff: float = 0.9,
+            increase: float = 1.0,
+    ) -> None:
+        if not 0 < backoff < 1:
+            raise ValueError(f"The `backoff` must be between 0 and 1, but received {backoff}")
+        if increase <= 0:
+            raise ValueError(f"The `increase` must be a positive number, but received {increase}")
+
+        super().__init__(min_limit, max_limit, initial)
+        self.latency_threshold = latency_threshold
+        self.backoff = backoff
+        self.increase = increase
+        self._cooldown = 0
+
+    def update(self, latency: float, failed: bool, inflight: int) -> None:
+        if self._cooldown:
+            self._cooldown -= 1
+
+        if failed or (self.latency_threshold is not None and latency > self.latency_threshold):
+            if not self._cooldown:
+                self._set(self._estimate * self.backoff)
+                self._cooldown = self.limit
+        elif inflight * 2 >= self.limit:
+            self._set(self._estimate + self.increase / self._estimate)
+
+
+class GradientLimiter(ConcurrencyLimiter):
+    """
+    Follows the ratio of the baseline to the short-term latency. While the latency stays near its baseline, the limit moves
+    towards `queue_size` (the square root of the limit by default) above the current one, and when the latency rises because
+    the downstream services queue the work, towards the limit scaled by the ratio, at most to a half. The limit takes
+    a `smoothing` part of that step per `limit` samples, about once per round trip of the pool. A failed task shrinks it too.
+
+        dp = Dispatcher(max_pool_size=0, limiter=GradientLimiter(min_limit=4, max_limit=200))
+
+    Args:
+        min_limit (int): The lowest limit.
+        max_limit (int): The highest limit.
+        initial (Optional[int]): The limit before the first sample, `min_limit` if None.
+        tolerance (float): How many times the short-term latency may exceed the baseline before the limit shrinks.
+        smoothing (float): The part of the step towards the new limit taken per `limit` samples, between 0 and 1.
+        short_window (int): The number of samples averaged into the short-term latency.
+        long_window (int): The number of samples over which the baseline, the lowest latency, follows a rise.
+        queue_size (Optional[int]): The headroom above the current limit, the square root of the limit if None.
+    """
+    def __init__(
+            self,
+            min_limit: int = 1,
+            max_limit: int = 100,
+            initial: Optional[int] = None,
+            tolerance: float = 1.5,
+            smoothing: float = 0.2,
+            short_window: int = 10,
+            long_window: int = 600,
+            queue_size: Optional[int] = None,
+    ) -> None:
+        if tolerance < 1:
+            raise ValueError(f"The `tolerance` cannot be less than 1, but received {tolerance}")
+        if not 0 < smoothing <= 1:
+            raise ValueError(f"The `smoothing` must be between 0 and 1, but received {smoothing}")
+        if not 0 < short_window <= long_window:
+            raise ValueError("The windows must be positive and `short_window` cannot exceed `long_window`")
+
+        super().__init__(min_limit, max_limit, initial)
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.short_window = short_window
+        self.long_window = long_window
+        self.queue_size = queue_size
+        self.short_latency = 0.0
+        self.baseline = 0.0
+        self._samples = 0
+
+    def update(self, latency: float, failed: bool, inflight: int) -> None:
+        if failed:
+            # a failure may be fast, so it is not taken as a latency sample
+            self._set(self._estimate - self.smoothing / 2)
+            return
+
+        self._samples += 1
+        if self._samples == 1:
+            self.short_latency = self.baseline = latency
+            return
+
+        self.short_latency += (latency - self.short_latency) / min(self._samples, self.short_window)
+        # the baseline drops at once to a lower latency and follows a lasting rise slowly
+        self.baseline = min(latency, self.baseline + (latency - self.baseline) / self.long_window)
+
+        if self.short_latency <= 0:
+            return
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.baseline / self.short_latency))
+        if gradient >= 1.0 and inflight * 2 < self.limit:
+            return
+
+        queue_size = math.sqrt(self._estimate) if self.queue_size is None else self.queue_size
+        estimate = self._estimate * gradient + queue_size
+        # one step per `limit` samples, the latency of a new limit is observed only after the tasks admitted under it finish
+        self._set(self._estimate + (estimate - self._estimate) * self.smoothing / self._estimate)
@@ -1,6 +1,8 @@
+import asyncio
 import logging
 from typing import Optional
 
+from taskorbit.dispatching.limiter import ConcurrencyLimiter
 from taskorbit.enums import TaskStatus
 
 
@@ -8,16 +10,52 @@ logger = logging.getLogger(__name__)
 
 
 class Pool(dict):
-    def __init__(self, max_size: Optional[int] = None) -> None:
+    def __init__(self, max_size: Optional[int] = None, limiter: Optional[ConcurrencyLimiter] = None) -> None:
         super().__init__()
-        if max_size is None:
+        if max_size is None and limiter is None:
             raise ValueError("Queue cannot be NoneType. For an unlimited queue, use 0.")
 
-        self.max_size = max_size
+        self._max_size = max_size or 0
+        self.limiter = limiter
+        self._released = asyncio.Event()
+
+    @property
+    def max_size(self) -> int:
+        """The maximum number of tasks, the current limit of the limiter if it is set"""
+        if self.limiter is not None:
+            return self.limiter.limit
+
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, value: int) -> None:
+        self._max_size = value
 
     @property
     def full(self) -> bool:
-        return len(self) >= self.max_size
+        return bool(self.max_size) and len(self) >= self.max_size
+
+    @property
+    def free(self) -> Optional[int]:
+        """The number of free slots, None for an unlimited pool"""
+        if not self.max_size:
+            return None
+
+        return max(self.max_size - len(self), 0)
+
+    def pop(self, key, *args):
+        value = super().pop(key, *args)
+        self._released.set()
+        return value
+
+    def __delitem__(self, key) -> None:
+        super().__delitem__(key)
+        self._released.set()
+
+    async def wait_released(self) -> None:
+        """Waits until a task is removed from the pool"""
+        self._released.clear()
+        await self._released.wait()
 
     def close_task(self, name: str) -> None:
         if name in self:
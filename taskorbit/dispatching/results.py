@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from taskorbit.enums import TaskStatus
+
+
+logger = logging.getLogger(__name__)
+
+
+class TaskRecord:
+    """
+    The state of a task kept in the `ResultStore`.
+
+    Attributes:
+        uuid (str): The uuid of the task.
+        status (TaskStatus): RUNNING, COMPLETED, FAILED or CANCELLED.
+        started_at (float): The unix time at which the task has started.
+        elapsed (Optional[float]): The duration of the finished task in seconds, None while it is running.
+        result (Any): The result of the completed task.
+        exception (Optional[str]): The exception of the failed task.
+    """
+    __slots__ = ("uuid", "status", "started_at", "elapsed", "result", "exception", "_start")
+
+    def __init__(self, uuid: str) -> None:
+        self.uuid = uuid
+        self.status = TaskStatus.RUNNING
+        self.started_at = time.time()
+        self.elapsed: Optional[float] = None
+        self.result: Any = None
+        self.exception: Optional[str] = None
+        self._start = time.monotonic()
+
+    def __repr__(self) -> str:
+        return f"<TaskRecord:{self.uuid} {self.status}>"
+
+    def finish(self, task: asyncio.Future) -> None:
+        self.elapsed = time.monotonic() - self._start
+        if task.cancelled():
+            self.status = TaskStatus.CANCELLED
+        elif task.exception() is not None:
+            self.status = TaskStatus.FAILED
+            self.exception = repr(task.exception())
+        else:
+            self.status = TaskStatus.COMPLETED
+            self.result = task.result()
+
+    def to_dict(self) -> dict[str, Any]:
+        """The response of `GET_STATUS`, the elapsed time of a running task is counted up to now"""
+        return {
+            "uuid": self.uuid,
+            "status": self.status.value,
+            "started_at": self.started_at,
+            "elapsed": time.monotonic() - self._start if self.elapsed is None else self.elapsed,
+            "result": self.result,
+            "exception": self.exception,
+        }
+
+
+class ResultStore:
+    """
+    The records of running tasks and a bounded LRU of finished ones, used to answer `GET_STATUS`, see `Dispatcher(results=...)`.
+
+    Args:
+        maxsize (int): The maximum number of finished tasks kept, the oldest ones are forgotten first.
+        ttl (Optional[float]): How long finished tasks are kept, in seconds, until evicted by `maxsize` if None.
+    """
+    def __init__(self, maxsize: int = 10_000, ttl: Optional[float] = None) -> None:
+        if maxsize < 1:
+            raise ValueError(f"The `maxsize` must be a positive number, but received {maxsize}")
+        if ttl is not None and ttl <= 0:
+            raise ValueError(f"The `ttl` must be a positive number, but received {ttl}")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.running: dict[str, TaskRecord] = {}
+        self.finished: OrderedDict[str, tuple[float, TaskRecord]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.running) + len(self.finished)
+
+    def start(self, uuid: str) -> None:
+        self.running[uuid] = TaskRecord(uuid)
+
+    def finish(self, task: asyncio.Task) -> None:
+        """The done-callback of the task of the message, the name of the task is its uuid"""
+        record = self.running.pop(task.get_name(), None)
+        if record is None:
+            return
+
+        record.finish(task)
+        expires = float("inf") if self.ttl is None else time.monotonic() + self.ttl
+        self.finished[record.uuid] = (expires, record)
+        self.finished.move_to_end(record.uuid)
+        if len(self.finished) > self.maxsize:
+            self.finished.popitem(last=False)
+
+    def get(self, uuid: str) -> Optional[TaskRecord]:
+        record = self.running.get(uuid)
+        if record is not None:
+            return record
+
+        item = self.finished.get(uuid)
+        if item is None:
+            return None
+
+        expires, record = item
+        if expires <= time.monotonic():
+            del self.finished[uuid]
+            return None
+
+        return record
@@ -2,7 +2,11 @@ import logging
 import uuid
 from typing import Optional, Type, Callable, Any
 
+from taskorbit.dispatching.batch import BatchHandler
+from taskorbit.dispatching.cache import ResultCache
+from taskorbit.dispatching.executor import ExecutorType, get_offload
 from taskorbit.dispatching.handler import HandlerType, Handler
+from taskorbit.dispatching.scheduler import Quota
 from taskorbit.filter import FilterType
 from taskorbit.models import Message
 from taskorbit.utils import validate_filters, evaluate_filters
@@ -16,6 +20,8 @@ class Router:
         self.name = name
         self.child_routers: dict["Router", tuple[FilterType, ...]] = {}
         self.handlers: dict[Type[HandlerType], tuple[FilterType, ...]] = {}
+        self.parent_routers: list["Router"] = []
+        self.quotas: dict[Any, Quota] = {}
 
     def __str__(self) -> str:
         return f"<Router:{self.name}>"
@@ -23,15 +29,61 @@ class Router:
     def __repr__(self) -> str:
         return self.__str__()
 
-    def include_router(self, router: "Router", *filters: FilterType) -> None:
+    def _tree_changed(self) -> None:
+        """Notifies the parent routers that the router tree has been changed, so the dispatcher can rebuild its routing index"""
+        for parent in self.parent_routers:
+            parent._tree_changed()
+
+    def _declare_quota(self, key: Any, concurrency: Optional[int], weight: Optional[int]) -> None:
+        """Stores the quota of a handler or a child router, if one of its parameters is set"""
+        if concurrency is not None or weight is not None:
+            self.quotas[key] = Quota(concurrency=concurrency, weight=1 if weight is None else weight)
+
+    def include_router(self, router: "Router", *filters: FilterType, concurrency: Optional[int] = None, weight: Optional[int] = None) -> None:
+        """
+        Includes a child router.
+
+        Args:
+            router (Router): The child router.
+            *filters (FilterType): The filters of the router.
+            concurrency (Optional[int]): The maximum number of tasks of all handlers of the router in the pool at the same time.
+            weight (Optional[int]): The share of free slots of the router when other handlers are waiting too, see `FairScheduler`.
+        """
         if not isinstance(router, Router):
             raise TypeError(f"The router must be an instance of Router, but received {type(router).__name__}")
 
         self.child_routers[router] = validate_filters(filters)
+        self._declare_quota(router, concurrency, weight)
+        router.parent_routers.append(self)
+        self._tree_changed()
+
+    def include_class_handler(
+        self,
+        *filters: FilterType,
+        concurrency: Optional[int] = None,
+        weight: Optional[int] = None,
+        executor: Optional[ExecutorType] = None,
+        executor_workers: Optional[int] = None,
+    ) -> Type[HandlerType]:
+        """
+        Includes a handler class.
+
+        Args:
+            *filters (FilterType): The filters of the handler.
+            concurrency (Optional[int]): The maximum number of tasks of the handler in the pool at the same time.
+            weight (Optional[int]): The share of free slots of the handler when other handlers are waiting too, see `FairScheduler`.
+            executor (Optional[ExecutorType]): Run `handle` in a "thread" or "process" pool instead of the event loop,
+                `handle` may then be a regular method. With "process" the handler instance is pickled.
+            executor_workers (Optional[int]): The size of the pool, handlers with the same `executor` and size share the pool.
+        """
+        offload = get_offload(executor, executor_workers) if executor is not None else None
 
-    def include_class_handler(self, *filters: FilterType) -> Type[HandlerType]:
         def wrapper(cls: HandlerType):
+            if offload is not None:
+                cls.executor = offload
             self.handlers[cls] = validate_filters(filters)
+            self._declare_quota(cls, concurrency, weight)
+            self._tree_changed()
             return cls
 
         return wrapper
@@ -43,9 +95,37 @@ class Router:
         on_execution_timeout: Optional[Callable] = None,
         close_timeout: Optional[int] = None,
         on_close: Optional[Callable] = None,
+        concurrency: Optional[int] = None,
+        weight: Optional[int] = None,
+        executor: Optional[ExecutorType] = None,
+        executor_workers: Optional[int] = None,
+        cache: bool | ResultCache = False,
     ) -> Callable:
+        """
+        Includes a handler function.
+
+        Args:
+            *filters (FilterType): The filters of the handler.
+            execution_timeout (Optional[int]): The timeout after which `on_execution_timeout` is called.
+            on_execution_timeout (Optional[Callable]): The callback of the execution timeout.
+            close_timeout (Optional[int]): The timeout after which the task is closed.
+            on_close (Optional[Callable]): The callback of the close timeout.
+            concurrency (Optional[int]): The maximum number of tasks of the handler in the pool at the same time.
+            weight (Optional[int]): The share of free slots of the handler when other handlers are waiting too, see `FairScheduler`.
+            executor (Optional[ExecutorType]): Run the handler in a "thread" or "process" pool instead of the event loop,
+                the handler may then be a regular function. With "process" it must be a module-level function.
+            executor_workers (Optional[int]): The size of the pool, handlers with the same `executor` and size share the pool.
+            cache (bool | ResultCache): Memoize the results of a deterministic handler by `type_event` and `data`, True for
+                a `ResultCache` with the default size and no TTL. A hit skips the handler and its timers.
+        """
+        offload = get_offload(executor, executor_workers) if executor is not None else None
+        if cache is True:
+            cache = ResultCache()
+
         def wrapper(handler: Callable):
             cls = Handler()
+            cls.executor = offload
+            cls.cache = cache if isinstance(cache, ResultCache) else None
             cls.name = handler.__name__
             cls.execution_timeout = execution_timeout
             cls.on_execution_cb = on_execution_timeout
@@ -53,6 +133,47 @@ class Router:
             cls.on_close_cb = on_close
             cls.handle = handler
             self.handlers[cls] = validate_filters(filters)
+            self._declare_quota(cls, concurrency, weight)
+            self._tree_changed()
+            return handler
+
+        return wrapper
+
+    def include_batch_handler(
+        self,
+        *filters: FilterType,
+        max_size: int = 100,
+        max_wait: float = 0.05,
+        concurrency: Optional[int] = None,
+        weight: Optional[int] = None,
+        executor: Optional[ExecutorType] = None,
+        executor_workers: Optional[int] = None,
+    ) -> Callable:
+        """
+        Includes a handler function that is called once with a list of the matching messages, see `BatchHandler`.
+
+            @router.include_batch_handler(F.metadata.type_event == "INSERT", max_size=500, max_wait=0.1)
+            async def insert(messages: list[Message]) -> None:
+                await db.insert_many([metadata.data for metadata in messages])
+
+        Args:
+            *filters (FilterType): The filters of the handler.
+            max_size (int): The maximum number of messages in a batch.
+            max_wait (float): The maximum time the first message of a batch waits for the others, in seconds.
+            concurrency (Optional[int]): The maximum number of tasks of the handler in the pool at the same time, it also bounds the batch.
+            weight (Optional[int]): The share of free slots of the handler when other handlers are waiting too, see `FairScheduler`.
+            executor (Optional[ExecutorType]): Run the handler in a "thread" or "process" pool instead of the event loop,
+                the handler may then be a regular function. With "process" it must be a module-level function.
+            executor_workers (Optional[int]): The size of the pool, handlers with the same `executor` and size share the pool.
+        """
+        offload = get_offload(executor, executor_workers) if executor is not None else None
+
+        def wrapper(handler: Callable):
+            cls = BatchHandler(handler, max_size=max_size, max_wait=max_wait)
+            cls.executor = offload
+            self.handlers[cls] = validate_filters(filters)
+            self._declare_quota(cls, concurrency, weight)
+            self._tree_changed()
             return handler
 
         return wrapper
@@ -0,0 +1,174 @@
+import heapq
+import logging
+import operator
+from dataclasses import dataclass
+from typing import Any, Optional, Type, Iterator, Hashable, Mapping
+
+from magic_filter import MagicFilter
+from magic_filter.operations import ComparatorOperation, FunctionOperation, GetAttributeOperation
+from magic_filter.util import in_op
+
+from taskorbit.dispatching.handler import HandlerType
+from taskorbit.dispatching.injection import HandlerPlan
+from taskorbit.dispatching.router import Router
+from taskorbit.dispatching.scheduler import Quota, DEFAULT_QUOTA
+from taskorbit.filter import FilterType
+from taskorbit.models import Message
+from taskorbit.utils import evaluate_filters
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Route:
+    """
+    A flattened path from the dispatcher to a handler.
+
+    Attributes:
+        order (int): The position of the handler in the depth-first walk of the router tree, the first matching route wins.
+        handler (Type[HandlerType]): The handler that the route leads to.
+        filters (tuple[FilterType, ...]): The router and handler filters that could not be resolved through the index.
+        plan (HandlerPlan): The injection plan of the handler.
+        lane (Optional[Hashable]): The handler or the router whose quota applies to the handler, None if there is no quota.
+        quota (Quota): The concurrency quota of the lane.
+    """
+    order: int
+    handler: Type[HandlerType]
+    filters: tuple[FilterType, ...]
+    plan: HandlerPlan
+    lane: Optional[Hashable] = None
+    quota: Quota = DEFAULT_QUOTA
+
+
+def extract_type_events(condition: FilterType) -> Optional[frozenset[Hashable]]:
+    """
+    Detects the filters `F.metadata.type_event == value` and `F.metadata.type_event.in_(values)`.
+
+    Args:
+        condition (FilterType): The filter to be checked.
+
+    :return: The set of `type_event` values to which the filter is limited, or None if the filter cannot be indexed
+    """
+    if not isinstance(condition, MagicFilter):
+        return None
+
+    operations = condition._operations
+    if len(operations) != 3:
+        return None
+
+    metadata_op, type_event_op, compare_op = operations
+    if not (
+        isinstance(metadata_op, GetAttributeOperation) and metadata_op.name == "metadata" and
+        isinstance(type_event_op, GetAttributeOperation) and type_event_op.name == "type_event"
+    ):
+        return None
+
+    if isinstance(compare_op, ComparatorOperation) and compare_op.comparator is operator.eq:
+        values = (compare_op.right,)
+    elif (
+        type(compare_op) is FunctionOperation and compare_op.function is in_op and
+        len(compare_op.args) == 1 and not compare_op.kwargs and
+        isinstance(compare_op.args[0], (set, frozenset, list, tuple))
+    ):
+        values = compare_op.args[0]
+    else:
+        return None
+
+    if any(isinstance(value, MagicFilter) for value in values):
+        return None
+
+    try:
+        return frozenset(values)
+    except TypeError:
+        return None
+
+
+def walk_routes(
+        router: Router,
+        chain: tuple[FilterType, ...] = (),
+        scope: tuple[Optional[Hashable], Quota] = (None, DEFAULT_QUOTA),
+) -> Iterator[tuple[Type[HandlerType], tuple[FilterType, ...], tuple[Optional[Hashable], Quota]]]:
+    """
+    Walks the router tree in the same order as `find_handler` does.
+
+    :return: The handler, all filters (router filters first) that must pass for the handler to be selected and the nearest declared
+        quota with its owner
+    """
+    for handler, handler_filters in router.handlers.items():
+        quota = router.quotas.get(handler)
+        yield handler, chain + handler_filters, scope if quota is None else (handler, quota)
+
+    for child_router, router_filters in router.child_routers.items():
+        quota = router.quotas.get(child_router)
+        yield from walk_routes(child_router, chain + router_filters, scope if quota is None else (child_router, quota))
+
+
+class RoutingIndex:
+    """
+    A compiled routing table of the router tree.
+
+    Handlers limited by `type_event` equality or `in_` filters are resolved with a dict lookup, the remaining handlers are checked
+    with a linear scan. The order of the original tree is preserved, so the result is the same as that of `find_handler`.
+
+    Attributes:
+        has_quotas (bool): Whether any handler or router of the tree declares a concurrency quota.
+        lanes (dict[Optional[Hashable], Quota]): The quotas of the tree by their owners, None for the handlers without a quota.
+
+    Args:
+        router (Router): The root of the router tree, usually the dispatcher.
+    """
+    def __init__(self, router: Router) -> None:
+        indexed: dict[Hashable, list[Route]] = {}
+        self._fallback: list[Route] = []
+        plans: dict[Type[HandlerType], HandlerPlan] = {}
+        self.has_quotas = False
+        self.lanes: dict[Optional[Hashable], Quota] = {}
+
+        for order, (handler, filters, (lane, quota)) in enumerate(walk_routes(router)):
+            self.has_quotas = self.has_quotas or lane is not None
+            self.lanes[lane] = quota
+            keys: Optional[frozenset[Hashable]] = None
+            residual: list[FilterType] = []
+            for condition in filters:
+                if condition is True:
+                    continue
+
+                type_events = extract_type_events(condition)
+                if type_events is None:
+                    residual.append(condition)
+                else:
+                    keys = type_events if keys is None else keys & type_events
+
+            if handler not in plans:
+                plans[handler] = HandlerPlan(handler)
+
+            route = Route(order=order, handler=handler, filters=tuple(residual), plan=plans[handler], lane=lane, quota=quota)
+            if keys is None:
+                self._fallback.append(route)
+            else:
+                for key in keys:
+                    indexed.setdefault(key, []).append(route)
+
+        self._table: dict[Hashable, list[Route]] = {
+            key: list(heapq.merge(routes, self._fallback, key=operator.attrgetter("order")))
+            for key, routes in indexed.items()
+        }
+        logger.debug(f"Routing index built: {len(self._table)} indexed type_event, {len(self._fallback)} unindexed handlers")
+
+    async def find(self, metadata: Message, data: Mapping[str, Any]) -> Route:
+        """
+        Finds the handler for the message.
+
+        Args:
+            metadata (Message): Data of the message to be processed.
+            data (Mapping[str, Any]): Message flow data mutated through outer middlewares
+
+        :return: The route of the first handler whose filters have passed
+        """
+        for route in self._table.get(metadata.type_event, self._fallback):
+            if not route.filters or await evaluate_filters(route.filters, metadata=metadata, data=data):
+                return route
+
+        raise RuntimeError("Handler not found")
+
@@ -0,0 +1,256 @@
+import bisect
+import logging
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional, Hashable, Callable
+
+from taskorbit.dispatching.pool import Pool
+from taskorbit.models import Message
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Quota:
+    """
+    The concurrency quota of a handler or a router, declared with `concurrency` and `weight` when it is included.
+
+    Args:
+        concurrency (Optional[int]): The maximum number of tasks of the lane in the pool at the same time, unlimited if None.
+        weight (int): The share of free slots that the lane gets when several lanes are waiting.
+    """
+    concurrency: Optional[int] = None
+    weight: int = 1
+
+    def __post_init__(self) -> None:
+        if self.concurrency is not None and self.concurrency < 1:
+            raise ValueError(f"The `concurrency` must be a positive number, but received {self.concurrency}")
+        if self.weight < 1:
+            raise ValueError(f"The `weight` must be a positive number, but received {self.weight}")
+
+
+DEFAULT_QUOTA = Quota()
+UNLIMITED_POOL_PREFETCH = 100  # the default `prefetch` of an unlimited pool when quotas are declared
+
+
+class Lane:
+    """
+    The admission state of the handlers that share a quota.
+
+    Attributes:
+        key (Hashable): The handler or the router that declared the quota, None for the handlers without a quota.
+        quota (Quota): The quota of the lane.
+        active (int): The number of tasks of the lane in the pool.
+        capacity (int): The maximum number of waiting messages of each priority, the share of `prefetch` proportional to the weight.
+        queues (dict[int, LaneQueue]): The messages waiting for a slot by their priority.
+    """
+    __slots__ = ("key", "quota", "active", "capacity", "queues")
+
+    def __init__(self, key: Hashable, quota: Quota) -> None:
+        self.key = key
+        self.quota = quota
+        self.active = 0
+        self.capacity = 0
+        self.queues: dict[int, LaneQueue] = {}
+
+    def __repr__(self) -> str:
+        return f"<Lane:{self.key} active={self.active} waiting={self.waiting}>"
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(queue.items) for queue in self.queues.values())
+
+    @property
+    def saturated(self) -> bool:
+        return self.quota.concurrency is not None and self.active >= self.quota.concurrency
+
+
+class LaneQueue:
+    """
+    The messages of one priority waiting in the lane.
+
+    Attributes:
+        lane (Lane): The lane of the queue.
+        priority (int): The priority of the messages.
+        items (deque[Message]): The waiting messages in the order of arrival.
+        deficit (float): The deficit counter of the round-robin.
+    """
+    __slots__ = ("lane", "priority", "items", "deficit", "backlogged")
+
+    def __init__(self, lane: Lane, priority: int) -> None:
+        self.lane = lane
+        self.priority = priority
+        self.items: deque[Message] = deque()
+        self.deficit = 0.0
+        self.backlogged = False
+
+
+class FairScheduler:
+    """
+    Admission of messages into the pool by priority and with deficit round-robin across lanes.
+
+    A message starts at once if the pool and its lane have a free slot, otherwise it waits in the lane. When a slot is released,
+    it goes to the highest priority that has waiting messages. Lanes with messages of the same priority take slots in turns
+    proportionally to their weights, so one bursty lane cannot take every slot of the pool.
+
+    Args:
+        pool (Pool): The pool of the dispatcher.
+        prefetch (int): The maximum number of messages of each priority waiting in all lanes, split across lanes by weight.
+        start (Callable[[Lane, Message], None]): Starts the task of the message in the pool.
+    """
+    def __init__(self, pool: Pool, prefetch: int, start: Callable[[Lane, Message], None]) -> None:
+        if prefetch < 0:
+            raise ValueError(f"The `prefetch` cannot be negative, but received {prefetch}")
+
+        self.pool = pool
+        self.prefetch = prefetch
+        self.lanes: dict[Hashable, Lane] = {}
+        self.buffered = 0
+        self._start = start
+        self._backlogs: dict[int, deque[LaneQueue]] = {}
+        self._priorities: list[int] = []  # negated, so that the highest priority is the first
+
+    def lane(self, key: Hashable, quota: Quota) -> Lane:
+        """Returns the lane of the key, creating it on the first use"""
+        lane = self.lanes.get(key)
+        if lane is None or lane.quota != quota:
+            if lane is None:
+                lane = self.lanes[key] = Lane(key, quota)
+            lane.quota = quota
+            self._split()
+
+        return lane
+
+    def set_prefetch(self, prefetch: int) -> None:
+        """Changes `prefetch`, the dispatcher sets its default when quotas are declared"""
+        if prefetch < 0:
+            raise ValueError(f"The `prefetch` cannot be negative, but received {prefetch}")
+
+        self.prefetch = prefetch
+        self._split()
+
+    def _split(self) -> None:
+        """Splits `prefetch` across the lanes by weight"""
+        total_weight = sum(item.quota.weight for item in self.lanes.values())
+        for item in self.lanes.values():
+            item.capacity = math.ceil(self.prefetch * item.quota.weight / total_weight)
+
+    def room(self) -> Optional[int]:
+        """
+        The number of messages that can be accepted now: the free slots that unsaturated lanes can take and the free places
+        in the lanes. Slots that only saturated lanes could use are not counted, but a message of a lane without room
+        is still rejected. Lanes that have not been created yet are not counted.
+
+        :return: The number of messages, None if it is unlimited
+        """
+        free = self.pool.free
+        if not self.lanes:
+            return None if free is None else free + max(self.prefetch - self.buffered, 0)
+
+        starts, places = 0, 0
+        for lane in self.lanes.values():
+            places += max(lane.capacity - lane.waiting, 0)
+            if lane.quota.concurrency is None:
+                if free is None:
+                    return None
+                starts += free
+            elif not lane.saturated:
+                starts += lane.quota.concurrency - lane.active
+
+        return (starts if free is None else min(starts, free)) + places
+
+    def _can_start(self, lane: Lane) -> bool:
+        return not self.pool.full and not lane.saturated
+
+    def _run(self, lane: Lane, metadata: Message) -> None:
+        lane.active += 1
+        self._start(lane, metadata)
+
+    def _queue(self, lane: Lane, priority: int) -> LaneQueue:
+        queue = lane.queues.get(priority)
+        if queue is None:
+            queue = lane.queues[priority] = LaneQueue(lane, priority)
+            if priority not in self._backlogs:
+                self._backlogs[priority] = deque()
+                bisect.insort(self._priorities, -priority)
+
+        return queue
+
+    def submit(self, lane: Lane, metadata: Message) -> bool:
+        """
+        Starts the message or puts it into the lane.
+
+        :return: False if the lane is full and the message has been rejected
+        """
+        if self._can_start(lane) and not lane.waiting:
+            self._run(lane, metadata)
+            return True
+
+        queue = self._queue(lane, metadata.priority)
+        if len(queue.items) >= lane.capacity:
+            logger.debug(f"{lane} is full, the task-{metadata.uuid} has been rejected")
+            return False
+
+        queue.items.append(metadata)
+        self.buffered += 1
+        if not queue.backlogged:
+            queue.backlogged = True
+            self._backlogs[queue.priority].append(queue)
+
+        return True
+
+    def release(self, lane: Lane) -> None:
+        """Frees the slot of a completed task and gives free slots to the waiting lanes"""
+        lane.active -= 1
+        self.dispatch()
+
+    def dispatch(self) -> None:
+        for inverted_priority in self._priorities:
+            if self.pool.full:
+                return
+
+            backlog = self._backlogs[-inverted_priority]
+            blocked = 0
+            while backlog and not self.pool.full and blocked < len(backlog):
+                queue = backlog[0]
+                lane = queue.lane
+                if lane.saturated:
+                    backlog.rotate(-1)
+                    blocked += 1
+                    continue
+
+                blocked = 0
+                if queue.deficit < 1:
+                    queue.deficit += lane.quota.weight
+
+                while queue.deficit >= 1 and queue.items and self._can_start(lane):
+                    queue.deficit -= 1
+                    self.buffered -= 1
+                    self._run(lane, queue.items.popleft())
+
+                if not queue.items:
+                    backlog.popleft()
+                    queue.backlogged = False
+                    queue.deficit = 0
+                elif queue.deficit < 1 or lane.saturated:
+                    backlog.rotate(-1)
+
+    def drain(self) -> list[Message]:
+        """
+        Removes all waiting messages, used by `Dispatcher.drain`.
+
+        :return: The messages that have not started, from the highest priority
+        """
+        messages: list[Message] = []
+        for inverted_priority in self._priorities:
+            for queue in self._backlogs[-inverted_priority]:
+                messages.extend(queue.items)
+                queue.items.clear()
+                queue.backlogged = False
+                queue.deficit = 0
+            self._backlogs[-inverted_priority].clear()
+
+        self.buffered = 0
+        return messages
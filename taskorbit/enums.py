@@ -12,14 +12,22 @@ class Commands(StrEnum):
 
     @classmethod
     def validate_key(cls, key):
-        return hasattr(cls, key)
+        return key in cls.__members__
 
 
 class TaskStatus(StrEnum):
     RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
     UNKNOWN = "UNKNOWN"
 
 
+class AckPolicy(StrEnum):
+    ACCEPT = "accept"  # when the dispatcher has accepted the message
+    COMPLETE = "complete"  # when the task of the message is done, see `BaseBroker`
+
+
 class WorkerType(StrEnum):
     class_type = "class_type"
     function_type = "function_type"
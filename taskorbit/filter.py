@@ -1,15 +1,162 @@
+import asyncio
+import inspect
 from abc import ABC, abstractmethod
-from typing import Union
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Union, Any, Mapping, Optional, ClassVar
 
-from magic_filter import MagicFilter
+from magic_filter import MagicFilter, AttrDict
+from magic_filter.operations import GetAttributeOperation
 
 from taskorbit.models import Message
 
 
-#  Under development!!!
 class BaseFilter(ABC):
+    """
+    A filter class for checks that cannot be expressed with `magic_filter`, for example a lookup in a database.
+    It receives only the message, so its result is evaluated once per message and shared by all routers and middlewares.
+
+        class IsKnownUser(BaseFilter):
+            async def __call__(self, metadata: Message) -> bool:
+                return await users.exists(metadata.data["user_id"])
+    """
     @abstractmethod
     async def __call__(self, metadata: Message) -> bool: ...
 
 
 FilterType = Union[MagicFilter, BaseFilter, bool, tuple]
+
+
+def _operands(operation: Any) -> list[Any]:
+    values: list[Any] = []
+    for cls in type(operation).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            value = getattr(operation, name, None)
+            values.extend(value if isinstance(value, (tuple, list)) else (value,))
+            if isinstance(value, dict):
+                values.extend(value.values())
+
+    return values
+
+
+def depends_on_metadata_only(condition: MagicFilter) -> bool:
+    """
+    Whether the filter reads nothing but `metadata`, for example `F.metadata.type_event == "A"`. Such filters give the same result
+    for the whole life of the message, while `data` may be changed by middlewares.
+    """
+    operations = condition._operations
+    if not operations or not isinstance(operations[0], GetAttributeOperation) or operations[0].name != "metadata":
+        return False
+
+    return all(
+        depends_on_metadata_only(value)
+        for operation in operations
+        for value in _operands(operation)
+        if isinstance(value, MagicFilter)
+    )
+
+
+METADATA_ONLY_CACHE_SIZE = 4096  # the filters of the handlers and middlewares of a tree, filters built per call are evicted
+_metadata_only: OrderedDict[int, tuple[MagicFilter, bool]] = OrderedDict()
+
+
+def _is_memoizable(condition: MagicFilter) -> bool:
+    # MagicFilter is neither hashable nor weakly referenceable, the filter is kept in the value, so its id is not reused while cached
+    key = id(condition)
+    item = _metadata_only.get(key)
+    if item is None:
+        item = _metadata_only[key] = (condition, depends_on_metadata_only(condition))
+        if len(_metadata_only) > METADATA_ONLY_CACHE_SIZE:
+            _metadata_only.popitem(last=False)
+    else:
+        _metadata_only.move_to_end(key)
+
+    return item[1]
+
+
+class FilterContext:
+    """
+    The evaluation context of the filters of one message, shared by the routing and both middleware managers.
+
+    The value resolved by magic filters is built once. The results of filters that depend only on `metadata` and of `BaseFilter`
+    are memoized by the filter object, so a filter reused across routers and middlewares is evaluated once per message.
+    Filters of `data` are evaluated each time, because middlewares may change it.
+
+    The dispatcher sets the context of the message in `FilterContext.current`, see `taskorbit.utils.evaluate_filters`.
+
+    Args:
+        metadata (Message): Data of the message to be processed.
+        data (Optional[Mapping[str, Any]]): Message flow data, the same object is passed to middlewares and handlers.
+    """
+    __slots__ = ("metadata", "data", "value", "_results")
+
+    current: ClassVar[ContextVar[Optional["FilterContext"]]] = ContextVar("taskorbit_filter_context", default=None)
+
+    def __init__(self, metadata: Message, data: Optional[Mapping[str, Any]] = None) -> None:
+        self.metadata = metadata
+        self.data = data
+        self.value = AttrDict(metadata=metadata) if data is None else AttrDict(metadata=metadata, data=data)
+        self._results: dict[int, tuple[FilterType, bool]] = {}
+
+    def with_data(self, data: Optional[Mapping[str, Any]]) -> "FilterContext":
+        """Returns the context of the same message with other flow data, the memoized results do not depend on it and are shared"""
+        context = FilterContext(self.metadata, data)
+        context._results = self._results
+        return context
+
+    def _memoized(self, condition: FilterType) -> Optional[bool]:
+        item = self._results.get(id(condition))
+        return None if item is None else item[1]
+
+    def _remember(self, condition: FilterType, result: bool) -> bool:
+        self._results[id(condition)] = (condition, result)
+        return result
+
+    def _resolve(self, condition: MagicFilter) -> bool:
+        if not _is_memoizable(condition):
+            return bool(condition.resolve(self.value))
+
+        result = self._memoized(condition)
+        if result is None:
+            result = self._remember(condition, bool(condition.resolve(self.value)))
+
+        return result
+
+    async def _call(self, condition: BaseFilter) -> bool:
+        result = condition(self.metadata)
+        if inspect.isawaitable(result):
+            result = await result
+
+        return self._remember(condition, bool(result))
+
+    async def check(self, filters: tuple[FilterType, ...]) -> bool:
+        """
+        Returns whether all filters pass. Booleans and magic filters are checked first and stop at the first failure,
+        then the remaining `BaseFilter` are awaited concurrently.
+
+        :raises TypeError: If a filter is not a `FilterType`
+        """
+        pending: dict[int, BaseFilter] = {}
+        for condition in filters:
+            if isinstance(condition, bool):
+                if not condition:
+                    return False
+            elif isinstance(condition, MagicFilter):
+                if not self._resolve(condition):
+                    return False
+            elif isinstance(condition, BaseFilter):
+                result = self._memoized(condition)
+                if result is None:
+                    pending[id(condition)] = condition
+                elif not result:
+                    return False
+            elif not isinstance(condition, FilterType):
+                raise TypeError(f"The `filters` must be instances of FilterType, {type(condition).__name__} is not part of this type")
+
+        if not pending:
+            return True
+        if len(pending) == 1:
+            return await self._call(*pending.values())
+
+        results = await asyncio.gather(*(self._call(condition) for condition in pending.values()))
+        return all(results)
@@ -0,0 +1,260 @@
+import asyncio
+import bisect
+import logging
+from contextvars import ContextVar
+from typing import Optional, Callable, Any
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+STAGES: tuple[str, ...] = ("decode", "lookup", "outer_middleware", "inner_middleware", "handler", "ack")
+
+
+def handler_label(handler: Any) -> str:
+    """Returns the name of the handler used as the `handler` label: the class name of class handlers, the function name otherwise"""
+    return handler.__name__ if isinstance(handler, type) else getattr(handler, "name", repr(handler))
+
+
+class Histogram:
+    """
+    A histogram of durations with fixed buckets, observing a value is a bisect and two additions.
+
+    Args:
+        buckets (tuple[float, ...]): The sorted upper bounds of the buckets in seconds, the `+Inf` bucket is implicit.
+    """
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimates the quantile by linear interpolation inside its bucket, like `histogram_quantile` of Prometheus.
+
+        :return: The estimated value in seconds, None if nothing has been observed
+        """
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+
+        return self.buckets[-1]
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Sample:
+    """
+    The timings of one message shared by the stages of the dispatcher and the broker, see `Metrics.sample`.
+    `settled` is set once the handler can no longer be found, the ack is then recorded with the handler known so far.
+    """
+    __slots__ = ("type_event", "handler", "lookup", "inner", "execution", "ack", "settled")
+
+    def __init__(self, type_event: str, settled: bool = False) -> None:
+        self.type_event = type_event
+        self.handler = ""
+        self.lookup = 0.0
+        self.inner = 0.0
+        self.execution = 0.0
+        self.ack: Optional[float] = None
+        self.settled = settled
+
+
+class Metrics:
+    """
+    Per-stage latency histograms and counters of the dispatcher, labelled by handler and `type_event`.
+
+    The dispatcher creates it with `Dispatcher(metrics=True)`, otherwise `Dispatcher.metrics` is None and the stages
+    only check that attribute. Stages:
+
+        decode - deserializing the message in the broker
+
+        lookup - finding the handler
+
+        outer_middleware, inner_middleware - the middlewares themselves, excluding the stages they wrap
+
+        handler - the execution of the handler, including its timeouts
+
+        ack - acknowledging the message in the broker
+
+    Args:
+        buckets (tuple[float, ...]): The upper bounds of the histogram buckets in seconds.
+    """
+    sample: ContextVar[Optional[Sample]] = ContextVar("taskorbit_metrics_sample", default=None)
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.histograms: dict[tuple[str, str, str], Histogram] = {}
+        self.counters: dict[tuple[str, str, str], int] = {}
+
+    def observe(self, stage: str, handler: str, type_event: str, seconds: float) -> None:
+        """Records the duration of the stage"""
+        key = (stage, handler, type_event)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def observe_ack(self, sample: Sample, seconds: float) -> None:
+        """
+        Records the duration of the ack by the handler of the message. An ack sent before the handler has been found,
+        with `AckPolicy.ACCEPT`, waits in the sample until `flush_ack`.
+        """
+        sample.ack = seconds
+        if sample.handler or sample.settled:
+            self.flush_ack(sample)
+
+    def flush_ack(self, sample: Sample) -> None:
+        """Records the ack waiting in the sample, if any"""
+        if sample.ack is not None:
+            self.observe("ack", sample.handler, sample.type_event, sample.ack)
+            sample.ack = None
+
+    def inc(self, name: str, handler: str = "", type_event: str = "", value: int = 1) -> None:
+        """Increments the counter"""
+        key = (name, handler, type_event)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self) -> dict[str, Any]:
+        """
+        Returns the stages and counters as plain data:
+        `{"stages": {stage: [{"handler", "type_event", "count", "sum", "p50", "p99"}, ...]}, "counters": {name: [...]}}`
+        """
+        stages: dict[str, list[dict[str, Any]]] = {}
+        for (stage, handler, type_event), histogram in self.histograms.items():
+            stages.setdefault(stage, []).append({"handler": handler, "type_event": type_event, **histogram.snapshot()})
+
+        counters: dict[str, list[dict[str, Any]]] = {}
+        for (name, handler, type_event), value in self.counters.items():
+            counters.setdefault(name, []).append({"handler": handler, "type_event": type_event, "value": value})
+
+        return {"stages": stages, "counters": counters}
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels: Any) -> str:
+    items = ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return f"{{{items}}}" if items else ""
+
+
+def render_prometheus(gauges: dict[str, float], metrics: Optional[Metrics], prefix: str = "taskorbit") -> str:
+    """
+    Renders the metrics in the Prometheus text exposition format.
+
+    Args:
+        gauges (dict[str, float]): The current values of the gauges by their names.
+        metrics (Optional[Metrics]): The histograms and counters, only the gauges are rendered if None.
+        prefix (str): The prefix of the metric names.
+
+    :return: str
+    """
+    lines: list[str] = []
+    for name, value in gauges.items():
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        lines.append(f"{prefix}_{name} {value}")
+
+    if metrics is None:
+        return "\n".join(lines) + "\n"
+
+    counters: dict[str, list[tuple[str, str, int]]] = {}
+    for (name, handler, type_event), value in metrics.counters.items():
+        counters.setdefault(name, []).append((handler, type_event, value))
+
+    for name, values in counters.items():
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        for handler, type_event, value in values:
+            lines.append(f"{prefix}_{name}_total{_labels(handler=handler, type_event=type_event)} {value}")
+
+    name = f"{prefix}_stage_duration_seconds"
+    lines.append(f"# TYPE {name} histogram")
+    for (stage, handler, type_event), histogram in metrics.histograms.items():
+        cumulative = 0
+        for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(stage=stage, handler=handler, type_event=type_event, le=bound)} {cumulative}")
+        labels = _labels(stage=stage, handler=handler, type_event=type_event)
+        lines.append(f"{name}_sum{labels} {histogram.sum}")
+        lines.append(f"{name}_count{labels} {histogram.count}")
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    A minimal local HTTP server that answers `GET /metrics` in the Prometheus text format, without extra dependencies.
+
+        server = MetricsServer(dp.render_metrics, port=9464)
+        await server.start()
+
+    Args:
+        render (Callable[[], str]): Returns the current metrics, usually `Dispatcher.render_metrics`.
+        host (str): The host to listen on.
+        port (int): The port to listen on.
+    """
+    def __init__(self, render: Callable[[], str], host: str = "127.0.0.1", port: int = 9464) -> None:
+        self.render = render
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.Server] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.debug(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, content_type, body = "200 OK", "text/plain; version=0.0.4; charset=utf-8", self.render().encode()
+            else:
+                status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", b"Not Found\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
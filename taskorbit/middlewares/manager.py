@@ -11,19 +11,93 @@ from taskorbit.utils import evaluate_filters, validate_filters
 logger = logging.getLogger(__name__)
 
 
+class MiddlewareChain:
+    """
+    A precompiled chain of middlewares around a handler.
+
+    Middlewares without filters are always part of the chain. Middlewares with filters are grouped by their filters,
+    each group is evaluated once per message and every distinct outcome maps to a chain built once and cached.
+
+    Args:
+        handler (Callable): The handler wrapped by the middlewares.
+        middlewares (dict[Middleware, tuple[FilterType, ...]]): The middlewares in the order they were included.
+    """
+    def __init__(self, handler: Callable, middlewares: dict[Middleware, tuple[FilterType, ...]]) -> None:
+        self.handler = handler
+        self._groups: list[tuple[FilterType, ...]] = []
+        self._layers: list[tuple[Middleware, int | None]] = []
+
+        for middleware, filters in middlewares.items():
+            if all(condition is True for condition in filters):
+                self._layers.append((middleware, None))
+                continue
+
+            for index, group in enumerate(self._groups):
+                if len(group) == len(filters) and all(a is b for a, b in zip(group, filters)):
+                    break
+            else:
+                index = len(self._groups)
+                self._groups.append(filters)
+
+            self._layers.append((middleware, index))
+
+        self._chains: dict[tuple[bool, ...], partial | Callable] = {}
+
+    def _build(self, outcome: tuple[bool, ...]) -> partial | Callable:
+        handler = self.handler
+        for middleware, group in self._layers:
+            if group is None or outcome[group]:
+                handler = partial(middleware, handler)
+
+        return handler
+
+    async def resolve(self, metadata: Metadata) -> partial | Callable:
+        """
+        Returns the chain of middlewares whose filters have passed for the message.
+
+        Args:
+            metadata (Metadata): Data of the message to be processed.
+        """
+        if self._groups:
+            outcome = tuple([await evaluate_filters(filters, metadata=metadata) for filters in self._groups])
+        else:
+            outcome = ()
+
+        chain = self._chains.get(outcome)
+        if chain is None:
+            chain = self._chains[outcome] = self._build(outcome)
+
+        return chain
+
+
 class MiddlewareManager:
     def __init__(self) -> None:
         self.middlewares: dict[Middleware, tuple[FilterType, ...]] = {}
+        self._chains: dict[Callable, MiddlewareChain] = {}
 
-    async def middleware_processing(self, handler: Callable, metadata: Metadata) -> partial | Callable:
-        for middleware, filters in self.middlewares.items():
-            if await evaluate_filters(filters, metadata=metadata):
-                handler: partial = partial(middleware, handler)
+    def compile(self, handler: Callable) -> MiddlewareChain:
+        """
+        Returns the compiled chain of middlewares for the handler. Chains are cached until the next `include` or `reset`.
 
-        return handler
+        Args:
+            handler (Callable): The handler wrapped by the middlewares, it must be the same object on every call to hit the cache.
+        """
+        chain = self._chains.get(handler)
+        if chain is None:
+            chain = self._chains[handler] = MiddlewareChain(handler, self.middlewares)
+
+        return chain
+
+    def reset(self) -> None:
+        """Drops the compiled chains"""
+        self._chains.clear()
+
+    async def middleware_processing(self, handler: Callable, metadata: Metadata) -> partial | Callable:
+        return await self.compile(handler).resolve(metadata)
 
     def include(self, middleware: Middleware, *filters: FilterType) -> None:
         if not isinstance(middleware, Middleware):
             raise TypeError(f"The `middleware` must be an instance of Middleware, but received {type(middleware).__name__}")
 
         self.middlewares[middleware] = validate_filters(filters)
+        self.reset()
@@ -1,40 +1,161 @@
-from dataclasses import dataclass, fields
+import types
+from dataclasses import dataclass, fields, MISSING
 from enum import EnumMeta
-from typing import Optional, Union
+from typing import Optional, Union, Any, Callable, AbstractSet, get_origin, get_args
 
 from taskorbit.enums import Commands
 
 
-@dataclass
+def _type_name(tp: Any) -> str:
+    return " | ".join(_type_name(arg) for arg in get_args(tp)) if get_origin(tp) in (Union, types.UnionType) else tp.__name__
+
+
+def _build_validator(name: str, field_type: Any) -> Callable[[Any], Any]:
+    """
+    Builds the validator of one field. The validator returns the value to be set or raises TypeError.
+
+    Args:
+        name (str): The name of the field.
+        field_type (Any): The annotation of the field: a class, an enum or an Optional/Union of classes.
+    """
+    if isinstance(field_type, EnumMeta):
+        members = field_type.__members__
+
+        def validator(value: Any) -> Any:
+            if isinstance(value, field_type):
+                return value
+            if isinstance(value, str) and value in members:
+                return members[value]
+            raise TypeError(f"Invalid value of {name}: {value!r} is not a member of {field_type.__name__}")
+
+        return validator
+
+    expected = get_args(field_type) if get_origin(field_type) in (Union, types.UnionType) else field_type
+    type_name = _type_name(field_type)
+
+    def validator(value: Any) -> Any:
+        if not isinstance(value, expected):
+            raise TypeError(f"Invalid nested type: {name}: {type(value).__name__} != {type_name}")
+        return value
+
+    return validator
+
+
+class _Schema:
+    """
+    The validation schema of a model, built once per class on the first use.
+
+    Attributes:
+        validators (tuple[tuple[str, Callable[[Any], Any]], ...]): The validators of the fields.
+        field_names (frozenset[str]): The names of all fields.
+        required_names (frozenset[str]): The names of the fields without defaults, they must be present, see `BaseType.validate_fields`.
+    """
+    __slots__ = ("validators", "field_names", "required_names")
+
+    def __init__(self, cls: type) -> None:
+        model_fields = fields(cls)
+        self.validators = tuple((field.name, _build_validator(field.name, field.type)) for field in model_fields)
+        self.field_names = frozenset(field.name for field in model_fields)
+        self.required_names = frozenset(
+            field.name for field in model_fields if field.default is MISSING and field.default_factory is MISSING
+        )
+
+
+@dataclass(slots=True)
 class BaseType:
     def __post_init__(self):
-        for field in fields(self):
-            attr_sel = getattr(self, field.name)
-            if isinstance(field.type, EnumMeta):
-                if field.type.validate_key(attr_sel):
-                    setattr(self, field.name, field.type[attr_sel])
-            elif not isinstance(attr_sel, field.type):
-                raise TypeError(f"Invalid nested type: {field.name}: {type(attr_sel).__name__} != {field.type.__name__}")
+        for name, validator in self._get_schema().validators:
+            setattr(self, name, validator(getattr(self, name)))
+
+    @classmethod
+    def _get_schema(cls) -> _Schema:
+        schema = cls.__dict__.get("_schema")
+        if schema is None:
+            schema = _Schema(cls)
+            cls._schema = schema
+
+        return schema
 
     @classmethod
-    def validate_fields(cls, data: set[str]) -> bool:
-        if not isinstance(data, set):
+    def validate_fields(cls, data: AbstractSet[str]) -> bool:
+        if not isinstance(data, AbstractSet):
             raise TypeError(f"The `data` must be a set, but received {type(data).__name__}")
 
-        return data == {field.name for field in fields(cls) if field.default is not None or field.name in data}
+        schema = cls._get_schema()
+        return schema.required_names <= data <= schema.field_names
 
 
-@dataclass
+@dataclass(slots=True)
 class Message(BaseType):
     uuid: str
     type_event: str
     data: Optional[dict] = None
+    priority: int = 0
+
+
+_DATA_SLOT = Message.__dict__["data"]
+
+
+class DeferredMessage(Message):
+    """
+    A message whose `data` is kept serialized until it is first accessed, so routing on `type_event` does not require
+    deserializing the whole body.
+
+    Use `DeferredMessage.create` to build it, the `data` is validated when it is loaded.
+    """
+    __slots__ = ("_raw_data", "_loader")
+
+    @classmethod
+    def create(cls, uuid: str, type_event: str, raw_data: bytes, loader: Callable[[bytes], Any], priority: int = 0) -> "DeferredMessage":
+        """
+        Args:
+            uuid (str): The uuid of the task.
+            type_event (str): The type of the event.
+            raw_data (bytes): The serialized `data`.
+            loader (Callable[[bytes], Any]): The function that deserializes `raw_data`.
+            priority (int): The priority of the task.
+        """
+        message = object.__new__(cls)
+        message.uuid = uuid
+        message.type_event = type_event
+        message.priority = priority
+        _DATA_SLOT.__set__(message, None)
+        message._raw_data = raw_data
+        message._loader = loader
+        for name, validator in Message._get_schema().validators:
+            if name != "data":
+                validator(getattr(message, name))
+
+        return message
+
+    @property
+    def data(self) -> Optional[dict]:
+        if self._raw_data is not None:
+            value = self._loader(self._raw_data)
+            if value is not None and not isinstance(value, dict):
+                raise TypeError(f"Invalid nested type: data: {type(value).__name__} != dict | NoneType")
+
+            _DATA_SLOT.__set__(self, value)
+            self._raw_data = None
+
+        return _DATA_SLOT.__get__(self)
+
+    @data.setter
+    def data(self, value: Optional[dict]) -> None:
+        self._raw_data = None
+        _DATA_SLOT.__set__(self, value)
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether `data` has already been deserialized"""
+        return self._raw_data is None
 
 
-@dataclass
+@dataclass(slots=True)
 class ServiceMessage(BaseType):
     uuid: str
     command: Commands
+    uuids: Optional[list] = None  # the batched form: the command applies to these uuids instead of `uuid`
 
 
 Metadata = Union[Message, ServiceMessage]
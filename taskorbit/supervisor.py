@@ -0,0 +1,218 @@
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import signal
+import time
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+from typing import Any, Optional
+
+from taskorbit.brokers.nats.client import NatsBroker
+from taskorbit.brokers.nats.configuration import NatsConfiguration
+from taskorbit.dispatching.dispatcher import Dispatcher
+
+
+logger = logging.getLogger(__name__)
+
+
+def load_object(path: str) -> Any:
+    """
+    Imports an object by its path in the `module:attribute` format.
+
+    Args:
+        path (str): For example `app.main:dp`.
+    """
+    module_name, _, attribute = path.partition(":")
+    if not module_name or not attribute:
+        raise ValueError(f"The path must be in the `module:attribute` format, but received {path!r}")
+
+    obj = importlib.import_module(module_name)
+    for name in attribute.split("."):
+        obj = getattr(obj, name)
+
+    return obj
+
+
+def split_pool_size(max_pool_size: int, workers: int, index: int) -> int:
+    """
+    Returns the share of `max_pool_size` for the worker with the given index. An unlimited pool (0) stays unlimited.
+
+    Args:
+        max_pool_size (int): The pool size of the dispatcher.
+        workers (int): The number of workers.
+        index (int): The index of the worker.
+    """
+    if not max_pool_size:
+        return max_pool_size
+
+    share, rest = divmod(max_pool_size, workers)
+    return max(share + (1 if index < rest else 0), 1)
+
+
+async def _serve(dp: Dispatcher, config: NatsConfiguration, drain_timeout: float) -> None:
+    broker = NatsBroker(config)
+    task = asyncio.create_task(broker.include_dispatcher(dp))
+    draining: Optional[asyncio.Task] = None
+
+    def _stop() -> None:
+        # Ctrl+C reaches the worker directly and once more as SIGTERM from the supervisor, so repeated signals are ignored
+        nonlocal draining
+        if draining is None:
+            logger.info(f"Draining the worker for up to {drain_timeout}s...")
+            draining = asyncio.create_task(broker.drain(dp, drain_timeout))
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, _stop)
+
+    try:
+        await task
+        if draining is not None:
+            await draining
+            if dp.pool:
+                # The acked tasks of AckPolicy.ACCEPT keep running until they finish or the supervisor kills the worker
+                logger.info(f"Waiting for {len(dp.pool)} acknowledged tasks...")
+                await asyncio.wait(list(dp.pool.values()))
+    except asyncio.CancelledError:
+        pass
+
+    logger.info("The worker has been stopped")
+
+
+def run_worker(
+    target: str,
+    config: NatsConfiguration,
+    workers: int,
+    index: int,
+    log_level: Optional[str] = None,
+    drain_timeout: float = 25.0,
+) -> None:
+    """
+    The entry point of the worker process: imports the dispatcher, takes its share of the pool and consumes messages.
+    SIGINT and SIGTERM drain the worker, see `taskorbit.brokers.BaseBroker.drain`.
+
+    Args:
+        target (str): The path to the dispatcher in the `module:attribute` format.
+        config (NatsConfiguration): The configuration of the broker.
+        workers (int): The number of workers.
+        index (int): The index of the worker.
+        log_level (Optional[str]): If set, the logging of the worker process is configured with this level.
+        drain_timeout (float): How long running tasks may finish after the signal, in seconds.
+    """
+    if log_level is not None:
+        logging.basicConfig(level=log_level)
+
+    dp = load_object(target)
+    if not isinstance(dp, Dispatcher):
+        raise TypeError(f"The target must be an instance of Dispatcher, but received {type(dp).__name__}")
+
+    limiter = dp.pool.limiter
+    if limiter is not None:
+        limiter.set_bounds(split_pool_size(limiter.min_limit, workers, index), split_pool_size(limiter.max_limit, workers, index))
+    else:
+        dp.pool.max_size = split_pool_size(dp.pool.max_size, workers, index)
+    logger.info(f"Worker-{index} started with max_pool_size={dp.pool.max_size}")
+    asyncio.run(_serve(dp, config, drain_timeout))
+
+
+class Supervisor:
+    """
+    Runs the dispatcher in several worker processes that share the same durable consumer.
+    Crashed workers are restarted, SIGINT and SIGTERM are forwarded to the workers, which drain: they stop fetching,
+    nak the messages that have not started for immediate redelivery and let the running tasks finish within `drain_timeout`.
+    With `AckPolicy.COMPLETE` the tasks still running then are cancelled and nak'ed too.
+
+    Args:
+        target (str): The path to the dispatcher in the `module:attribute` format.
+        config (NatsConfiguration): The configuration of the broker.
+        workers (Optional[int]): The number of worker processes, the number of CPUs by default. `max_pool_size` of the dispatcher is
+            spread across them.
+        restart_delay (float): Pause before restarting a crashed worker, in seconds.
+        shutdown_timeout (float): How long to wait for the workers to stop before killing them, in seconds.
+        log_level (Optional[str]): The logging level of the worker processes, logging is not configured if None.
+        drain_timeout (Optional[float]): How long the running tasks of the workers may finish, in seconds, 80% of `shutdown_timeout`
+            if None, so that the workers have time to nak the cancelled tasks. Must be less than `shutdown_timeout`.
+    """
+    def __init__(
+        self,
+        target: str,
+        config: NatsConfiguration,
+        workers: Optional[int] = None,
+        restart_delay: float = 1.0,
+        shutdown_timeout: float = 30.0,
+        log_level: Optional[str] = None,
+        drain_timeout: Optional[float] = None,
+    ) -> None:
+        workers = workers or multiprocessing.cpu_count()
+        if workers < 1:
+            raise ValueError(f"The number of workers must be positive, but received {workers}")
+
+        if drain_timeout is None:
+            drain_timeout = shutdown_timeout * 0.8
+        if not 0 <= drain_timeout < shutdown_timeout:
+            raise ValueError(f"The `drain_timeout` must be between 0 and `shutdown_timeout`, but received {drain_timeout}")
+
+        if workers > 1 and not config.pull_mode and config.queue is None:
+            config.queue = config.durable
+
+        self.target = target
+        self.config = config
+        self.workers = workers
+        self.restart_delay = restart_delay
+        self.shutdown_timeout = shutdown_timeout
+        self.log_level = log_level
+        self.drain_timeout = drain_timeout
+
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: dict[int, BaseProcess] = {}
+        self._stopping = False
+
+    def _start(self, index: int) -> None:
+        process = self._context.Process(
+            target=run_worker,
+            args=(self.target, self.config, self.workers, index, self.log_level, self.drain_timeout),
+            name=f"taskorbit-worker-{index}",
+        )
+        process.start()
+        self._processes[index] = process
+        logger.info(f"Worker-{index} started, pid={process.pid}")
+
+    def _signal_handler(self, signum: int, _: Optional[Any]) -> None:
+        logger.info(f"Received signal {signal.Signals(signum).name}, stopping workers...")
+        self._stopping = True
+
+    def _shutdown(self) -> None:
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        for index, process in self._processes.items():
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning(f"Worker-{index} did not stop in time and will be killed")
+                process.kill()
+                process.join()
+
+    def run(self) -> None:
+        """Starts the workers and supervises them until SIGINT or SIGTERM"""
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
+
+        for index in range(self.workers):
+            self._start(index)
+
+        try:
+            while not self._stopping:
+                wait([process.sentinel for process in self._processes.values()], timeout=0.5)
+                for index, process in list(self._processes.items()):
+                    if self._stopping or process.is_alive():
+                        continue
+
+                    logger.error(f"Worker-{index} exited with code {process.exitcode}, restarting in {self.restart_delay}s")
+                    time.sleep(self.restart_delay)
+                    if not self._stopping:
+                        self._start(index)
+        finally:
+            self._shutdown()
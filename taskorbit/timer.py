@@ -1,23 +1,141 @@
 import asyncio
+import math
 from logging import getLogger
 from typing import Optional, Callable, Awaitable, Any
 
 logger = getLogger(__name__)
 
 
+class Timer:
+    """
+    A timer armed in the `TimerWheel`. It is not a task, the callback task is created only when the timer expires.
+
+    Attributes:
+        tick (int): The tick of the wheel at which the timer expires.
+        callback (Callable[..., Awaitable[None]]): The coroutine function called when the timer expires.
+        kwargs (dict[str, Any]): The keyword arguments of the callback.
+    """
+    __slots__ = ("tick", "callback", "kwargs", "_wheel")
+
+    def __init__(self, wheel: "TimerWheel", tick: int, callback: Callable[..., Awaitable[None]], kwargs: dict[str, Any]) -> None:
+        self._wheel = wheel
+        self.tick = tick
+        self.callback = callback
+        self.kwargs = kwargs
+
+    def cancel(self) -> None:
+        self._wheel.cancel(self)
+
+
+class TimerWheel:
+    """
+    A hashed timing wheel shared by all handlers of the dispatcher.
+
+    Timers are kept in buckets by the tick at which they expire, so arming and cancelling a timer is O(1).
+    The wheel is driven by a single `loop.call_at` callback that runs once per tick while there are armed timers.
+
+    Args:
+        resolution (float): The duration of one tick in seconds, timers expire no earlier than their timeout and at most one tick later.
+    """
+    def __init__(self, resolution: float = 0.1) -> None:
+        if resolution <= 0:
+            raise ValueError(f"The resolution must be a positive number, but received {resolution}")
+
+        self.resolution = resolution
+        self._buckets: dict[int, dict[Timer, None]] = {}
+        self._count = 0
+        self._last_tick = 0
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._running: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def call_later(self, delay: float, callback: Callable[..., Awaitable[None]], **kwargs) -> Timer:
+        """
+        Arms a timer.
+
+        Args:
+            delay (float): The timeout in seconds.
+            callback (Callable[..., Awaitable[None]]): The coroutine function called when the timer expires.
+            **kwargs: The keyword arguments of the callback.
+        """
+        loop = asyncio.get_running_loop()
+        tick = math.ceil((loop.time() + delay) / self.resolution)
+
+        timer = Timer(self, tick, callback, kwargs)
+        self._buckets.setdefault(tick, {})[timer] = None
+        self._count += 1
+
+        if self._handle is None:
+            self._last_tick = math.floor(loop.time() / self.resolution)
+            self._schedule(loop)
+
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        """Disarms the timer, does nothing if it has already expired or been cancelled"""
+        bucket = self._buckets.get(timer.tick)
+        if bucket is None or timer not in bucket:
+            return
+
+        del bucket[timer]
+        if not bucket:
+            del self._buckets[timer.tick]
+
+        self._count -= 1
+        if not self._count and self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._handle = loop.call_at((self._last_tick + 1) * self.resolution, self._advance, loop)
+
+    def _advance(self, loop: asyncio.AbstractEventLoop) -> None:
+        current_tick = math.floor(loop.time() / self.resolution)
+        for tick in range(self._last_tick + 1, current_tick + 1):
+            bucket = self._buckets.pop(tick, None)
+            if bucket is None:
+                continue
+
+            self._count -= len(bucket)
+            for timer in bucket:
+                task = loop.create_task(timer.callback(**timer.kwargs))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+        self._last_tick = max(current_tick, self._last_tick)
+        if self._count:
+            self._schedule(loop)
+        else:
+            self._handle = None
+
+
 class TimerManager:
-    def __init__(self):
-        self.timers: list[asyncio.Task] = []
+    """
+    Timers of a handler. Timers are armed in the shared `TimerWheel`, the dispatcher sets its own wheel to `wheel`.
 
-    async def start_timer(self, timeout: Optional[int], callback: Callable[..., Awaitable[None]], **kwargs) -> Optional[asyncio.Task]:
-        async def timer() -> None:
-            await asyncio.sleep(timeout)
-            await callback(**kwargs)
+    Args:
+        wheel (Optional[TimerWheel]): The wheel of the timers, a new one is created on the first timer if None.
+    """
+    def __init__(self, wheel: Optional[TimerWheel] = None):
+        self.wheel = wheel
+        self.timers: set[Timer] = set()
 
+    async def start_timer(self, timeout: Optional[int], callback: Callable[..., Awaitable[None]], **kwargs) -> Optional[Timer]:
         if timeout is not None:
-            task = asyncio.create_task(timer())
-            self.timers.append(task)
-            return task
+            if self.wheel is None:
+                self.wheel = TimerWheel()
+
+            timer = self.wheel.call_later(timeout, callback, **kwargs)
+            self.timers.add(timer)
+            return timer
+
+    def cancel_timer(self, timer: Optional[Timer]) -> None:
+        """Cancels one timer, for example when several messages are processed by the same handler instance"""
+        if timer is not None:
+            timer.cancel()
+            self.timers.discard(timer)
 
     def cancel_timers(self, *args):
         for timer in self.timers:
@@ -1,32 +1,153 @@
 import inspect
 import logging
+from collections.abc import ItemsView, KeysView, ValuesView
 from types import NoneType
-from typing import Callable, Any
+from typing import Callable, Any, Iterator, Mapping, Optional
 
-from magic_filter import MagicFilter, AttrDict
-
-from taskorbit.filter import FilterType, BaseFilter
+from taskorbit.filter import FilterType, FilterContext
 from taskorbit.models import Message
 
 
 logger = logging.getLogger(__name__)
 
+_MISSING = object()
+
+
+class OverlayDict(dict):
+    """
+    A copy-on-write view of a base mapping that is still a `dict`. Writes go to the overlay, deleted keys of the base are
+    recorded, so `del`, `pop` and `popitem` behave as on a copy, while the base itself is never changed or copied.
+    The dispatcher gives it to each message as the data over `stream_data`.
+
+    Args:
+        base (Mapping[str, Any]): The mapping read through for the keys not written or deleted in the overlay.
+    """
+    __slots__ = ("_base", "_deleted")
+
+    def __init__(self, base: Mapping[str, Any]) -> None:
+        super().__init__()
+        self._base = base
+        self._deleted: set[str] = set()
+
+    def _has_base(self, key: Any) -> bool:
+        return key in self._base and key not in self._deleted
+
+    def __getitem__(self, key: Any) -> Any:
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        if self._has_base(key):
+            return self._base[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self._deleted.discard(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key: Any) -> None:
+        found = self._has_base(key)
+        if dict.__contains__(self, key):
+            dict.__delitem__(self, key)
+            found = True
+        if not found:
+            raise KeyError(key)
+        if key in self._base:
+            self._deleted.add(key)
+
+    def __contains__(self, key: Any) -> bool:
+        return dict.__contains__(self, key) or self._has_base(key)
+
+    def __iter__(self) -> Iterator[Any]:
+        yield from dict.__iter__(self)
+        for key in self._base:
+            if key not in self._deleted and not dict.__contains__(self, key):
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __bool__(self) -> bool:
+        return any(True for _ in self)
+
+    def __eq__(self, other: Any) -> bool:
+        return dict(self.items()) == other if isinstance(other, Mapping) else NotImplemented
+
+    def __ne__(self, other: Any) -> bool:
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
 
-async def evaluate_filters(filters: FilterType, *args, **kwargs) -> bool:
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+    def __or__(self, other: Any) -> dict:
+        return {**self, **other} if isinstance(other, Mapping) else NotImplemented
+
+    def __ior__(self, other: Any) -> "OverlayDict":
+        self.update(other)
+        return self
+
+    def __reduce__(self) -> tuple:
+        return dict, (dict(self.items()),)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        return self[key] if key in self else default
+
+    def keys(self) -> KeysView:
+        return KeysView(self)
+
+    def values(self) -> ValuesView:
+        return ValuesView(self)
+
+    def items(self) -> ItemsView:
+        return ItemsView(self)
+
+    def pop(self, key: Any, default: Any = _MISSING) -> Any:
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        if default is _MISSING:
+            raise KeyError(key)
+        return default
+
+    def popitem(self) -> tuple[Any, Any]:
+        for key in self:
+            return key, self.pop(key)
+        raise KeyError("popitem(): dictionary is empty")
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self) -> None:
+        dict.clear(self)
+        self._deleted.update(self._base)
+
+    def copy(self) -> dict:
+        return dict(self.items())
+
+
+async def evaluate_filters(filters: tuple[FilterType, ...], metadata: Message, data: Optional[Mapping[str, Any]] = None) -> bool:
     """
-    Filters need to be improved!!!!!!!!
+    Returns whether all filters pass for the message. Inside the task of a message the `FilterContext` of the message is used,
+    so results are memoized across routers and middlewares, see `FilterContext`.
+
+    Args:
+        filters (tuple[FilterType, ...]): The filters, all of them must pass.
+        metadata (Message): Data of the message to be processed.
+        data (Optional[Mapping[str, Any]]): Message flow data.
     """
-    for condition in filters:
-        if isinstance(condition, MagicFilter) and not condition.resolve(AttrDict(*args, **kwargs)):
-            return False
-        elif isinstance(condition, bool) and not condition:
-            return False
-        # elif isinstance(condition, BaseFilter) and not await condition(metadata):
-        #     return False
-        elif not isinstance(condition, FilterType):  # default
-            raise TypeError(f"The `filters` must be instances of FilterType, {type(condition).__name__} is not part of this type")
-
-    return True
+    context: Optional[FilterContext] = FilterContext.current.get()
+    if context is None or context.metadata is not metadata:
+        context = FilterContext(metadata, data)
+    elif data is not None and context.data is not data:
+        context = context.with_data(data)
+
+    return await context.check(filters)
 
 
 def validate_filters(filters: FilterType) -> tuple[FilterType]: